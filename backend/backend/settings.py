@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
+import sys
 from dotenv import load_dotenv
 import cloudinary
 
@@ -26,6 +27,20 @@ load_dotenv()
 FLUTTERWAVE_WEBHOOK_SECRET = os.getenv("FLUTTERWAVE_WEBHOOK_SECRET")
 FLW_SECRET_KEY = os.getenv("FLW_SECRET_KEY")
 FLW_SANDBOX = True
+FLW_BASE_URL = "https://api.flutterwave.com/v3"
+FLW_TIMEOUT = (3.05, 15)  # (connect, read) seconds
+FLW_MAX_RETRIES = 2
+FLW_POOL_SIZE = 20
+
+# Payment gateway clients, see ordora/gateway.py. Use ordora.gateway.FakeGateway /
+# ordora.gateway.AsyncFakeGateway to run payment flows without the network.
+PAYMENT_GATEWAY = os.getenv("PAYMENT_GATEWAY", "ordora.gateway.FlutterwaveGateway")
+PAYMENT_GATEWAY_ASYNC = os.getenv("PAYMENT_GATEWAY_ASYNC", "ordora.gateway.AsyncFlutterwaveGateway")
+# How long a gateway answer for payment_status polls is reused
+PAYMENT_STATUS_CACHE_SECONDS = 5
+
+# How long stock stays reserved for an unpaid order
+STOCK_RESERVATION_MINUTES = int(os.getenv("STOCK_RESERVATION_MINUTES", 30))
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
@@ -69,6 +84,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware
+    "ordora.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
 
@@ -86,13 +103,29 @@ ROOT_URLCONF = 'backend.urls'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    "DEFAULT_THROTTLE_RATES": {
+        "payment_status": "30/min",
+        # Checked before any password hashing (users.throttles)
+        "login_ip": os.getenv("LOGIN_IP_RATE", "30/min"),
+        "login_account": os.getenv("LOGIN_ACCOUNT_RATE", "10/min"),
+        "register_ip": os.getenv("REGISTER_IP_RATE", "10/hour"),
+    },
+    # Reverse proxies in front of the app. Throttles take the client address
+    # from the X-Forwarded-For entry the outermost one added, or with none from
+    # REMOTE_ADDR: clients can send any X-Forwarded-For they like
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", "0")),
 }
 
+# How long a process trusts its answer to "is this token's user still active?"
+# Name and role come from the token; token refreshes re-read them, so a change
+# reaches a user's requests within ACCESS_TOKEN_LIFETIME.
+AUTH_STATE_CACHE_SECONDS = int(os.getenv("AUTH_STATE_CACHE_SECONDS", "30"))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -144,6 +177,33 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections come from a psycopg 3 pool (DB_POOL, on by default): a request
+# borrows an open connection instead of paying for a TCP/TLS handshake and
+# authentication. With the pool off, connections persist for DB_CONN_MAX_AGE
+# seconds instead; the pool requires CONN_MAX_AGE 0.
+DB_POOL = os.getenv("DB_POOL", "1") == "1"
+# Behind PgBouncer in transaction pooling mode: no server-side cursors, which
+# don't survive the transaction that opened them (the streaming exports then
+# read each chunk through a client-side cursor)
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+# Prepared statements, off unless set: psycopg prepares a query on the server
+# once it has run this many times on a connection. Needs server-side parameter
+# binding. Safe behind PgBouncer 1.21+ with max_prepared_statements set, which
+# tracks protocol-level prepared statements across server connections.
+DB_PREPARE_THRESHOLD = os.getenv("DB_PREPARE_THRESHOLD")
+
+_db_options = {}
+if DB_POOL:
+    _db_options["pool"] = {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        # Seconds a request waits for a free connection before failing
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    }
+if DB_PREPARE_THRESHOLD:
+    _db_options["server_side_binding"] = True
+    _db_options["prepare_threshold"] = int(DB_PREPARE_THRESHOLD)
+
 DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.postgresql",
@@ -152,10 +212,56 @@ DATABASES = {
             "PASSWORD": os.environ.get("PASSWORD"),
             "HOST": os.environ.get("HOST"),
             "PORT": "5432",
+            "CONN_MAX_AGE": 0 if DB_POOL else int(os.getenv("DB_CONN_MAX_AGE", "60")),
+            # Pooled connections are checked before they are handed out (Django
+            # passes the pool its check), persistent ones before a request's first query
+            "CONN_HEALTH_CHECKS": True,
+            "DISABLE_SERVER_SIDE_CURSORS": DB_PGBOUNCER,
+            "OPTIONS": _db_options,
         }
     }
 
 
+# Cache
+# Redis when REDIS_URL is set (shared by all workers, needs the redis package),
+# otherwise per-process memory
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Route the goods, order and payment read paths to ordora.async_views; on by
+# default under backend/asgi.py, off under WSGI where async views gain nothing
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "0") == "1"
+
+# Lifetime of cached goods list/detail responses; writes invalidate them sooner
+GOODS_CACHE_SECONDS = 300
+# The lifetime instead with the per-process cache, where writes made by other
+# processes (the workers, cron commands, other web workers) can't invalidate
+LOCAL_CACHE_SECONDS = 5
+
+# Largest order create request: orders in one POSTed batch, items per order.
+# The whole batch holds its stock row locks for one transaction.
+ORDER_BATCH_MAX_ORDERS = 20
+ORDER_MAX_ITEMS = 100
+
+# Bulk catalogue import (ordora.bulk): rows per upsert statement, row errors reported per import
+CATALOGUE_IMPORT_CHUNK_SIZE = 1000
+CATALOGUE_IMPORT_MAX_ERRORS = 1000
+# Rows per server-side cursor fetch in the streaming exports (ordora.exports)
+EXPORT_CHUNK_SIZE = 2000
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -174,6 +280,26 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 AUTH_USER_MODEL = 'users.User'
+
+# The first hasher hashes new passwords; the others still verify older
+# hashes, which are rewritten with the first on the next login.
+_PASSWORD_HASHERS = {
+    "argon2": "users.hashers.TunedArgon2PasswordHasher",
+    "bcrypt": "users.hashers.TunedBCryptSHA256PasswordHasher",
+}
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "argon2")
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS[PASSWORD_HASHER],
+    *(path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER),
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+# Per-hash cost. Django's Argon2 defaults (100 MiB, 8 lanes) are tuned for a
+# single login, not bursts; these follow the OWASP minimum for Argon2id.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "19456"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
 # ALLOWED_HOSTS = ['192.168.43.235']
 ALLOWED_HOSTS = ['*']
 
@@ -201,4 +327,45 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-MEDIA_URL = '/media/'
\ No newline at end of file
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+# Uploaded images wait here until `manage.py process_media_jobs` picks them up
+# (reads the same path), so web and worker processes must share this directory
+MEDIA_STAGING_ROOT = BASE_DIR / 'media' / 'staging'
+# ordora.media.LocalBackend keeps images under MEDIA_ROOT, for offline use
+MEDIA_BACKEND = os.getenv("MEDIA_BACKEND", "ordora.media.CloudinaryBackend")
+# WebP variants generated for every goods image: name -> longest edge in pixels.
+# List endpoints serve "small", detail serves "large"; ?image_size= overrides.
+IMAGE_VARIANTS = {"thumb": 160, "small": 480, "large": 1200}
+IMAGE_VARIANT_QUALITY = 80
+
+# Prometheus metrics (ordora.metrics) are only served to a scraper sending
+# "Authorization: Bearer <METRICS_TOKEN>", or to these addresses. Nobody by
+# default: behind a reverse proxy on the same host every client is 127.0.0.1.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv("METRICS_ALLOWED_IPS", "").split(",") if ip]
+
+# `manage.py test` logs errors only, so per-request lines and 4xx warnings don't bury the results
+TESTING = sys.argv[1:2] == ["test"]
+LOG_LEVEL = os.getenv("LOG_LEVEL", "ERROR" if TESTING else "INFO")
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "ordora.logs.JSONFormatter"},
+        "text": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        # Written from a background thread, see ordora.logs
+        "console": {
+            "()": "ordora.logs.BackgroundStreamHandler",
+            "formatter": os.getenv("LOG_FORMAT", "json"),
+        },
+    },
+    "root": {"handlers": ["console"], "level": LOG_LEVEL},
+    "loggers": {
+        "django": {"handlers": ["console"], "level": LOG_LEVEL, "propagate": False},
+        # One line per request with timings, from ordora.metrics.MetricsMiddleware
+        "ordora.requests": {"level": os.getenv("REQUEST_LOG_LEVEL", "ERROR" if TESTING else "INFO")},
+    },
+}
@@ -14,11 +14,19 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from ordora.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/goods/', include('ordora.urls')),
     path('api/auth/', include('users.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
+
+# Images written by ordora.media.LocalBackend; served by Django only in development
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,155 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import OrderItem, Payment, ProducerGoodsDaily, ProducerSalesDaily
+
+PERIODS = {
+    "day": None,
+    "week": TruncWeek,
+    "month": TruncMonth,
+}
+
+# At the price paid, so rollups match Order.total_price and the producer ledger
+LINE_REVENUE = ExpressionWrapper(F("quality") * F("unit_price"), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _bump(model, key, revenue, units, orders=None):
+    model.objects.bulk_create([model(**key)], ignore_conflicts=True)
+    changes = {"revenue": F("revenue") + revenue, "units": F("units") + units}
+    if orders is not None:
+        changes["orders"] = F("orders") + orders
+    model.objects.filter(**key).update(**changes)
+
+
+def record_sales(order_ids):
+    """Add newly paid orders to the daily rollups, bucketed by their payment's paid_at."""
+    paid_on = {
+        order_id: timezone.localdate(paid_at) if paid_at else timezone.localdate()
+        for order_id, paid_at in Payment.objects.filter(order_id__in=order_ids).values_list("order_id", "paid_at")
+    }
+    lines = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values("order_id", "product_id", "product__producer_id")
+        .annotate(revenue=Sum(LINE_REVENUE), units=Sum("quality"))
+    )
+
+    goods, sales = {}, {}
+    for line in lines:
+        day = paid_on.get(line["order_id"], timezone.localdate())
+        producer_id = line["product__producer_id"]
+
+        key = (producer_id, line["product_id"], day)
+        revenue, units = goods.get(key, (0, 0))
+        goods[key] = (revenue + line["revenue"], units + line["units"])
+
+        key = (producer_id, day)
+        revenue, units, orders = sales.get(key, (0, 0, set()))
+        sales[key] = (revenue + line["revenue"], units + line["units"], orders | {line["order_id"]})
+
+    with transaction.atomic():
+        for (producer_id, day), (revenue, units, orders) in sales.items():
+            _bump(ProducerSalesDaily, {"producer_id": producer_id, "day": day}, revenue, units, len(orders))
+        for (producer_id, product_id, day), (revenue, units) in goods.items():
+            _bump(
+                ProducerGoodsDaily,
+                {"producer_id": producer_id, "product_id": product_id, "day": day},
+                revenue, units,
+            )
+
+
+def rebuild_rollups():
+    """Recompute both rollup tables from every paid order. Returns the number of daily sales rows written."""
+    paid = OrderItem.objects.filter(order__payment__status="paid", order__payment__paid_at__isnull=False)
+    day = TruncDate("order__payment__paid_at")
+
+    with transaction.atomic():
+        ProducerSalesDaily.objects.all().delete()
+        ProducerGoodsDaily.objects.all().delete()
+
+        sales = (
+            paid.annotate(day=day)
+            .values("product__producer_id", "day")
+            .annotate(revenue=Sum(LINE_REVENUE), units=Sum("quality"), orders=Count("order_id", distinct=True))
+        )
+        ProducerSalesDaily.objects.bulk_create(
+            (
+                ProducerSalesDaily(
+                    producer_id=row["product__producer_id"], day=row["day"],
+                    revenue=row["revenue"], units=row["units"], orders=row["orders"],
+                )
+                for row in sales.iterator(chunk_size=2000)
+            ),
+            batch_size=2000,
+        )
+
+        goods = (
+            paid.annotate(day=day)
+            .values("product__producer_id", "product_id", "day")
+            .annotate(revenue=Sum(LINE_REVENUE), units=Sum("quality"))
+        )
+        ProducerGoodsDaily.objects.bulk_create(
+            (
+                ProducerGoodsDaily(
+                    producer_id=row["product__producer_id"], product_id=row["product_id"], day=row["day"],
+                    revenue=row["revenue"], units=row["units"],
+                )
+                for row in goods.iterator(chunk_size=2000)
+            ),
+            batch_size=2000,
+        )
+    return ProducerSalesDaily.objects.count()
+
+
+def sales_summary(producer, period="day", start=None, end=None, top=10):
+    """Bucketed sales, top goods and totals for `producer` between `start` and `end` (inclusive dates)."""
+    end = end or timezone.localdate()
+    start = start or end - timedelta(days=364)
+
+    daily = ProducerSalesDaily.objects.filter(producer=producer, day__gte=start, day__lte=end)
+    bucket = PERIODS[period]
+    buckets = (
+        daily.annotate(start=bucket("day") if bucket else F("day"))
+        .values("start")
+        .annotate(revenue=Sum("revenue"), units=Sum("units"), orders=Sum("orders"))
+        .order_by("start")
+    )
+
+    top_goods = (
+        ProducerGoodsDaily.objects.filter(producer=producer, day__gte=start, day__lte=end)
+        .values("product_id", "product__name")
+        .annotate(revenue=Sum("revenue"), units=Sum("units"))
+        .order_by("-revenue")[:top]
+    )
+
+    totals = daily.aggregate(revenue=Sum("revenue"), units=Sum("units"), orders=Sum("orders"))
+    revenue = totals["revenue"] or 0
+    orders = totals["orders"] or 0
+
+    return {
+        "period": period,
+        "start": start,
+        "end": end,
+        "buckets": [
+            {
+                "start": row["start"],
+                "revenue": row["revenue"],
+                "units": row["units"],
+                "orders": row["orders"],
+            }
+            for row in buckets
+        ],
+        "top_goods": [
+            {"product": row["product_id"], "name": row["product__name"], "revenue": row["revenue"], "units": row["units"]}
+            for row in top_goods
+        ],
+        "totals": {
+            "revenue": revenue,
+            "units": totals["units"] or 0,
+            "orders": orders,
+            "average_order_value": round(revenue / orders, 2) if orders else 0,
+        },
+    }
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OrdoraConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ordora'
+
+    def ready(self):
+        # Registers the per-connection query counter before any connection opens
+        from . import metrics  # noqa: F401
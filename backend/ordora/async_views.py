@@ -0,0 +1,272 @@
+"""
+Native async versions of the goods, order and payment endpoints.
+
+ordora.urls serves these in place of the DRF views when settings.ASYNC_VIEWS
+is on, which backend/asgi.py does by default. They await the database through
+the async ORM and Flutterwave through the pooled httpx client
+(`get_async_gateway()`), so a slow client or a slow upstream holds a
+coroutine rather than a worker thread. Work that needs transactions
+(idempotency keys, applying a payment status) goes through sync_to_async.
+
+Each view answers the same payloads, status codes and errors as its sync
+counterpart, reusing the serializers' `.values()` row path. Responses are
+JSON only; there is no browsable API here.
+"""
+import logging
+from functools import wraps
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.request import Request
+
+from users.authentication import ClaimsJWTAuthentication
+
+from .caching import acatalogue_version, agoods_version, etag_matches, response_key, response_seconds
+from .gateway import GatewayError, get_async_gateway
+from .idempotency import aidempotent
+from .models import Goods, Order, Payment
+from .pagination import GoodsCursorPagination
+from .reconcile import TERMINAL_STATUSES, agateway_status, apply_gateway_status, checked_status
+from .renderers import ORJSONRenderer
+from .serializers import GoodsSerializer, GoodsSummarySerializer, OrderSerializer, PaymentSerializer
+from .throttles import PaymentStatusThrottle
+from .views import GoodsListView, qr_payment_payload
+
+logger = logging.getLogger(__name__)
+
+_authenticator = ClaimsJWTAuthentication()
+_renderer = ORJSONRenderer()
+
+
+class JSONResponse(HttpResponse):
+    """orjson-rendered JSON that keeps its payload as `.data`, like DRF's Response."""
+
+    def __init__(self, data=None, status=200, **kwargs):
+        self.data = data
+        super().__init__(_renderer.render(data), status=status, content_type="application/json", **kwargs)
+
+
+def error_response(request, exc):
+    """What DRF's exception handling makes of `exc`."""
+    headers = {}
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        headers["WWW-Authenticate"] = _authenticator.authenticate_header(request)
+    if getattr(exc, "wait", None):
+        headers["Retry-After"] = "%d" % exc.wait
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    return JSONResponse(data, status=exc.status_code, headers=headers)
+
+
+def async_api_view(methods, permission_classes=(IsAuthenticated,), throttle_classes=()):
+    """
+    @api_view for async views: authentication, permissions, throttling and
+    API errors as DRF does them. The view gets a DRF Request, for the
+    serializers and paginators, and returns a JSONResponse.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(http_request, *args, **kwargs):
+            request = Request(http_request)
+            try:
+                if request.method not in methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+
+                result = await _authenticator.aauthenticate(request)
+                request.user, request.auth = result or (AnonymousUser(), None)
+
+                for permission in (cls() for cls in permission_classes):
+                    if not permission.has_permission(request, None):
+                        if not request.user.is_authenticated:
+                            raise exceptions.NotAuthenticated()
+                        raise exceptions.PermissionDenied(getattr(permission, "message", None))
+
+                for throttle in (cls() for cls in throttle_classes):
+                    # Throttle history lives in the cache, read and written synchronously
+                    if not await sync_to_async(throttle.allow_request)(request, None):
+                        raise exceptions.Throttled(throttle.wait())
+
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(request, exc)
+
+        return wrapper
+
+    return decorator
+
+
+def _context(request, image_size="large"):
+    # GoodsImageField takes its default size from the view
+    return {"request": request, "view": SimpleNamespace(image_size=image_size)}
+
+
+async def cached(request, version, build):
+    """CachedRetrieveMixin.get for async views: 304 on a current ETag, else the cached or built response."""
+    etag, key = response_key(version, request)
+    if etag_matches(request, etag):
+        return JSONResponse(status=304, headers={"ETag": etag})
+
+    data = await cache.aget(key)
+    if data is None:
+        response = await build()
+        if response.status_code != 200:
+            return response
+        await cache.aset(key, response.data, response_seconds())
+    else:
+        response = JSONResponse(data)
+
+    response["ETag"] = etag
+    return response
+
+
+async def _values(queryset, pk, not_found):
+    try:
+        return await queryset.aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        raise exceptions.NotFound(not_found)
+
+
+@async_api_view(["GET"], permission_classes=[AllowAny])
+async def goods_list(request):
+    async def build():
+        serializer = GoodsSummarySerializer(context=_context(request, GoodsListView.image_size))
+        columns = GoodsListView.required_columns
+        queryset = serializer.optimize_queryset(Goods.objects.all(), columns)
+        queryset = queryset.values(*serializer.value_columns(), *columns)
+
+        paginator = GoodsCursorPagination()
+        page = await paginator.apaginate_queryset(queryset, request)
+        return JSONResponse(paginator.get_paginated_data(serializer.rows(page)))
+
+    return await cached(request, await acatalogue_version(), build)
+
+
+@async_api_view(["GET"])
+async def goods_detail(request, pk):
+    async def build():
+        serializer = GoodsSerializer(context=_context(request))
+        queryset = serializer.optimize_queryset(Goods.objects.all()).values(*serializer.value_columns())
+        row = await _values(queryset, pk, "No Goods matches the given query.")
+        return JSONResponse(serializer.rows([row])[0])
+
+    return await cached(request, await agoods_version(pk), build)
+
+
+def _order_rows(request, queryset):
+    serializer = OrderSerializer(context=_context(request))
+    queryset = serializer.optimize_queryset(queryset).prefetch_related(None)
+    return serializer, queryset.values(*serializer.value_columns())
+
+
+async def _order_list(request, queryset):
+    serializer, rows = _order_rows(request, queryset)
+    return JSONResponse(await serializer.arows([row async for row in rows]))
+
+
+async def _order_detail(request, queryset, pk):
+    serializer, rows = _order_rows(request, queryset)
+    row = await _values(rows, pk, "No Order matches the given query.")
+    return JSONResponse((await serializer.arows([row]))[0])
+
+
+@async_api_view(["GET"])
+async def my_orders(request):
+    return await _order_list(request, Order.objects.for_customer(request.user))
+
+
+@async_api_view(["GET"])
+async def my_order_detail(request, pk):
+    return await _order_detail(request, Order.objects.for_customer(request.user), pk)
+
+
+@async_api_view(["GET"])
+async def producer_orders(request):
+    return await _order_list(request, Order.objects.for_producer(request.user))
+
+
+@async_api_view(["GET"])
+async def producer_order_detail(request, pk):
+    return await _order_detail(request, Order.objects.for_producer(request.user), pk)
+
+
+@async_api_view(["POST"])
+@aidempotent(JSONResponse)
+async def create_flutterwave_qr(request, order_id):
+    try:
+        order = await Order.objects.select_related("customer", "payment").aget(id=order_id)
+    except Order.DoesNotExist:
+        return JSONResponse({"error": "Order not found"}, status=404)
+
+    existing = getattr(order, "payment", None)
+    if existing is not None:
+        return JSONResponse(PaymentSerializer(existing).data)
+
+    payload = qr_payment_payload(order)
+    tx_ref = payload["tx_ref"]
+    try:
+        data = await get_async_gateway().initialize_payment(payload)
+    except GatewayError:
+        logger.warning("Payment gateway unavailable", extra={"order_id": order.id}, exc_info=True)
+        return JSONResponse({"error": "Payment gateway unavailable"}, status=503)
+
+    if data.get("status") != "success":
+        logger.warning(
+            "Payment initialization rejected",
+            extra={"order_id": order.id, "tx_ref": tx_ref, "gateway_message": data.get("message")},
+        )
+        return JSONResponse({"error": "Flutterwave init failed", "detail": data}, status=400)
+
+    payment, _ = await Payment.objects.aget_or_create(
+        reference=tx_ref,
+        defaults={
+            "order": order,
+            "amount": order.total_price,
+            "qr_code": data["data"]["link"],
+            "status": "pending",
+        },
+    )
+    return JSONResponse(PaymentSerializer(payment).data)
+
+
+@async_api_view(["GET"])
+async def customer_payments(request):
+    serializer = PaymentSerializer(context={"request": request})
+    payments = Payment.objects.filter(
+        order__customer=request.user
+    ).order_by("-created_at").values(*serializer.value_columns())
+    return JSONResponse(serializer.rows([row async for row in payments]))
+
+
+@async_api_view(["GET"])
+async def payment_by_order(request, order_id):
+    try:
+        payment = await Payment.objects.aget(order_id=order_id)
+    except Payment.DoesNotExist:
+        return JSONResponse({"error": "QR Payment not found"}, status=404)
+    return JSONResponse(PaymentSerializer(payment).data)
+
+
+@async_api_view(["GET"], throttle_classes=[PaymentStatusThrottle])
+async def payment_status(request, reference):
+    try:
+        payment = await Payment.objects.select_related("order").aget(reference=reference)
+    except Payment.DoesNotExist:
+        return JSONResponse({"error": "Payment not found"}, status=404)
+
+    if payment.status in TERMINAL_STATUSES:
+        return JSONResponse({"status": TERMINAL_STATUSES[payment.status], "reference": reference})
+
+    try:
+        flw_status = checked_status(payment, await agateway_status(reference))
+    except GatewayError:
+        return JSONResponse({"error": "Payment gateway unavailable"}, status=503)
+
+    # Conditional update plus stock confirmation, in one transaction
+    await sync_to_async(apply_gateway_status)(payment, flw_status)
+    return JSONResponse({"status": flw_status, "reference": reference})
@@ -0,0 +1,501 @@
+"""
+Synthetic data and scripted traffic for local benchmarks.
+
+`manage.py seed_benchmark_data` bulk-loads producers, customers, goods,
+orders with items and producer links, and payments, all from a seeded RNG
+so two runs at the same scale produce the same data.
+`manage.py run_benchmark` replays a weighted mix of catalogue, order,
+payment, webhook and login requests through Django's test client, with
+FakeGateway in place of Flutterwave. It writes per-scenario latency
+percentiles, throughput, query counts and time spent opening database
+connections to a JSON file for comparison across releases.
+
+Connections are released after every request as under a real server (the
+test client leaves them open), so connection overhead shows up as it would
+in production: compare a run with DB_POOL=0 against one with the pool on,
+e.g. over the catalogue scenarios only and with the response cache off:
+
+    DB_POOL=0 manage.py run_benchmark --scenarios catalogue_list,catalogue_search,goods_detail --no-cache
+"""
+import json
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connection, connections, transaction
+from django.test import Client, override_settings
+from django.utils import timezone
+from rest_framework.throttling import SimpleRateThrottle
+
+from users.models import User
+from users.tokens import ClaimsRefreshToken
+
+from . import webhooks
+from .models import Goods, Order, OrderItem, Payment, ProducerOrder
+
+EMAIL_DOMAIN = "bench.ordora.test"
+PASSWORD = "benchmark-password"
+WEBHOOK_SECRET = "benchmark-webhook-secret"
+WORDS = (
+    "rice beans yam garri maize millet sorghum cassava plantain tomato pepper onion okra egusi "
+    "ogbono palm oil groundnut cashew mango orange pineapple pawpaw ginger garlic honey fish "
+    "catfish tilapia crayfish goat chicken turkey egg milk cheese yoghurt cocoa coffee tea"
+).split()
+
+
+def _email(kind, n):
+    return f"{kind}-{n}@{EMAIL_DOMAIN}"
+
+
+def exists():
+    return User.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}").exists()
+
+
+def clear():
+    """Delete every row created by `seed()`; goods, orders and payments cascade from the users."""
+    return User.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}").delete()[0]
+
+
+def seed(goods=100_000, orders=200_000, producers=None, customers=None, seed=0, batch_size=5000, log=None):
+    """
+    Bulk-load benchmark data. Returns the number of rows created per model.
+
+    Orders get 1-5 items each, and roughly 70% of them a payment (mostly
+    paid). Producers default to one per 100 goods, customers to one per
+    10 orders.
+    """
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    producers = producers or max(1, goods // 100)
+    customers = customers or max(1, orders // 10)
+    # Hashed once; every benchmark user can log in with PASSWORD
+    password = make_password(PASSWORD)
+    counts = {}
+
+    def users(kind, count, role):
+        rows = (
+            User(email=_email(kind, n), name=f"{kind.title()} {n}", role=role, password=password)
+            for n in range(count)
+        )
+        created = _bulk_create(User, rows, batch_size)
+        return list(
+            User.objects.filter(email__startswith=f"{kind}-", email__endswith=f"@{EMAIL_DOMAIN}")
+            .values_list("id", flat=True)
+        ), created
+
+    producer_ids, counts["producers"] = users("producer", producers, "producer")
+    customer_ids, counts["customers"] = users("customer", customers, "customer")
+    log(f"{counts['producers']} producers, {counts['customers']} customers")
+
+    goods_rows = (
+        Goods(
+            name=" ".join(rng.sample(WORDS, 2)).title(),
+            description=" ".join(rng.choices(WORDS, k=rng.randint(5, 40))),
+            price=Decimal(rng.randint(100, 500_000)) / 100,
+            # Deep stock, so scripted orders never run out
+            quality=1_000_000,
+            producer_id=rng.choice(producer_ids),
+        )
+        for _ in range(goods)
+    )
+    counts["goods"] = _bulk_create(Goods, goods_rows, batch_size)
+    catalogue = list(
+        Goods.objects.filter(producer_id__in=producer_ids).values_list("id", "price", "producer_id")
+    )
+    log(f"{counts['goods']} goods")
+
+    counts.update(orders=0, items=0, producer_orders=0, payments=0)
+    now = timezone.now()
+    for start in range(0, orders, batch_size):
+        batch = []
+        for _ in range(min(batch_size, orders - start)):
+            lines = [(rng.choice(catalogue), rng.randint(1, 5)) for _ in range(rng.randint(1, 5))]
+            paid = rng.random()
+            batch.append((lines, paid, now - timedelta(days=rng.randint(0, 180))))
+        _seed_orders(batch, customer_ids, rng, counts)
+        log(f"{counts['orders']} orders")
+    return counts
+
+
+def _seed_orders(batch, customer_ids, rng, counts):
+    with transaction.atomic():
+        orders = [
+            Order(
+                customer_id=rng.choice(customer_ids),
+                total_price=sum(price * quantity for (_, price, _), quantity in lines),
+                status="PAID" if paid < 0.6 else "PENDING",
+            )
+            for lines, paid, _ in batch
+        ]
+        Order.objects.bulk_create(orders)
+        # created_at is auto_now_add; spread orders over the past months
+        # afterwards, one UPDATE per day rather than a per-row bulk_update
+        by_day = {}
+        for order, (_, _, created_at) in zip(orders, batch):
+            order.created_at = created_at
+            by_day.setdefault(created_at, []).append(order.pk)
+        for created_at, ids in by_day.items():
+            Order.objects.filter(pk__in=ids).update(created_at=created_at)
+
+        items, links, payments = [], [], []
+        for order, (lines, paid, created_at) in zip(orders, batch):
+            shares = {}
+            for (product_id, price, producer_id), quantity in lines:
+                items.append(OrderItem(order=order, product_id=product_id, quality=quantity, unit_price=price))
+                revenue, units = shares.get(producer_id, (Decimal("0"), 0))
+                shares[producer_id] = (revenue + price * quantity, units + quantity)
+            paid_at = created_at if order.status == "PAID" else None
+            links.extend(
+                ProducerOrder(
+                    producer_id=producer_id, order=order, order_created_at=created_at,
+                    revenue=revenue, units=units, paid_at=paid_at,
+                )
+                for producer_id, (revenue, units) in shares.items()
+            )
+            if paid < 0.7:
+                status = "paid" if order.status == "PAID" else ("failed" if paid > 0.65 else "pending")
+                payments.append(Payment(
+                    order=order, reference=f"bench-{order.pk}", amount=order.total_price,
+                    status=status, qr_code=f"https://checkout.fake/bench-{order.pk}", paid_at=paid_at,
+                ))
+        OrderItem.objects.bulk_create(items)
+        ProducerOrder.objects.bulk_create(links)
+        Payment.objects.bulk_create(payments)
+
+    counts["orders"] += len(orders)
+    counts["items"] += len(items)
+    counts["producer_orders"] += len(links)
+    counts["payments"] += len(payments)
+
+
+def _bulk_create(model, rows, batch_size):
+    created = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            model.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+class QueryCounter:
+    """connection.execute_wrapper hook counting the queries of the current thread."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class ConnectClock:
+    """
+    Times DatabaseWrapper.connect per thread: opening a new connection, or
+    checking one out of the pool when pooling is on.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def reading(self):
+        return getattr(self.local, "count", 0), getattr(self.local, "seconds", 0.0)
+
+    def patch(self):
+        wrapper_class = type(connections[DEFAULT_DB_ALIAS])
+        original = wrapper_class.connect
+        clock = self
+
+        def connect(wrapper):
+            start = time.perf_counter()
+            try:
+                return original(wrapper)
+            finally:
+                count, seconds = clock.reading()
+                clock.local.count, clock.local.seconds = count + 1, seconds + time.perf_counter() - start
+
+        return mock.patch.object(wrapper_class, "connect", connect)
+
+
+class Session:
+    """One simulated client: a customer with a token, replaying scenarios."""
+
+    def __init__(self, runner, customer, goods_ids, rng):
+        self.runner = runner
+        # A 500 is counted as an error in the report rather than aborting the run
+        self.client = Client(raise_request_exception=False)
+        self.customer = customer
+        self.goods_ids = goods_ids
+        self.rng = rng
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {ClaimsRefreshToken.for_user(customer).access_token}"}
+        self.unpaid = []
+
+    def request(self, scenario, method, path, expect=(200,), **kwargs):
+        counter = QueryCounter()
+        connects, connect_seconds = self.runner.clock.reading()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = getattr(self.client, method)(path, **kwargs)
+        # request_finished's handler, which the test client disconnects: closes the
+        # connection, returns it to the pool or keeps it for CONN_MAX_AGE
+        if not connection.in_atomic_block:
+            close_old_connections()
+        elapsed = time.perf_counter() - start
+        after, after_seconds = self.runner.clock.reading()
+        self.runner.record(
+            scenario, elapsed, counter.count, response.status_code in expect,
+            after - connects, after_seconds - connect_seconds,
+        )
+        return response
+
+    def catalogue_list(self):
+        response = self.request("catalogue_list", "get", "/api/goods/")
+        next_url = response.json().get("next") if response.status_code == 200 else None
+        if next_url:
+            self.request("catalogue_list", "get", next_url.split("testserver", 1)[-1])
+
+    def catalogue_search(self):
+        query = self.rng.choice(WORDS)
+        self.request("catalogue_search", "get", f"/api/goods/search/?q={query}")
+
+    def goods_detail(self):
+        self.request("goods_detail", "get", f"/api/goods/{self.rng.choice(self.goods_ids)}/", **self.auth)
+
+    def order_create(self):
+        items = [
+            {"product": product, "quality": self.rng.randint(1, 3)}
+            for product in self.rng.sample(self.goods_ids, self.rng.randint(1, 3))
+        ]
+        response = self.request(
+            "order_create", "post", "/api/goods/create/order/", expect=(201,),
+            data={"items": items}, content_type="application/json", **self.auth,
+        )
+        if response.status_code == 201:
+            self.unpaid.append(response.json())
+
+    def order_list(self):
+        self.request("order_list", "get", "/api/goods/customer/order/", **self.auth)
+
+    def payment(self):
+        if not self.unpaid:
+            return self.order_create()
+        order = self.unpaid.pop()
+        response = self.request(
+            "payment_create", "post", f"/api/goods/payments/create-qr/{order['id']}/", **self.auth
+        )
+        if response.status_code != 200:
+            return
+        payment = response.json()
+        payload = {
+            "event": "charge.completed",
+            "data": {
+                "id": payment["id"],
+                "tx_ref": payment["reference"],
+                "status": "successful",
+                "amount": float(order["total_price"]),
+                "currency": "NGN",
+                "meta": {"order_id": order["id"]},
+            },
+        }
+        self.request(
+            "webhook", "post", "/api/goods/payments/flutterwave/webhook/",
+            data=payload, content_type="application/json",
+            HTTP_VERIF_HASH=WEBHOOK_SECRET,
+        )
+
+    def login(self):
+        self.request(
+            "login", "post", "/api/auth/login/",
+            data={"email": self.customer.email, "password": PASSWORD}, content_type="application/json",
+        )
+
+
+# Scenario -> share of the traffic
+MIX = {
+    "catalogue_list": 30,
+    "catalogue_search": 15,
+    "goods_detail": 20,
+    "order_list": 10,
+    "order_create": 10,
+    "payment": 10,
+    "login": 5,
+}
+
+
+def percentiles(samples):
+    if len(samples) == 1:
+        return samples * 3
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+class Runner:
+    def __init__(self, requests=1000, concurrency=8, seed=0, mix=None, cache=True):
+        self.requests = requests
+        self.concurrency = concurrency
+        self.seed = seed
+        self.mix = mix or MIX
+        # cache=False swaps in a dummy cache, so every request reaches the database
+        self.cache = cache
+        self.samples = {}
+        self.lock = threading.Lock()
+        self.clock = ConnectClock()
+
+    def record(self, scenario, seconds, queries, ok, connects=0, connect_seconds=0.0):
+        with self.lock:
+            self.samples.setdefault(scenario, []).append((seconds, queries, ok, connects, connect_seconds))
+
+    def plan(self):
+        rng = random.Random(self.seed)
+        names = list(self.mix)
+        script = rng.choices(names, weights=[self.mix[name] for name in names], k=self.requests)
+        # Deal the script round-robin, one share per simulated client
+        return [script[i::self.concurrency] for i in range(self.concurrency)]
+
+    def run_client(self, index, script, customers, goods_ids):
+        rng = random.Random(f"{self.seed}-{index}")
+        session = Session(self, customers[index % len(customers)], goods_ids, rng)
+        try:
+            for scenario in script:
+                getattr(session, scenario)()
+        finally:
+            if self.concurrency > 1:
+                connection.close()
+
+    def run(self):
+        customers = list(User.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}", role="customer")[:self.concurrency])
+        goods_ids = list(
+            Goods.objects.filter(producer__email__endswith=f"@{EMAIL_DOMAIN}").values_list("id", flat=True)[:10_000]
+        )
+        if not customers or not goods_ids:
+            raise ValueError("No benchmark data; run `manage.py seed_benchmark_data` first")
+
+        # Throttles would turn a load test into a test of the throttles
+        throttles_off = {scope: None for scope in SimpleRateThrottle.THROTTLE_RATES}
+        started = time.perf_counter()
+        overrides = {"PAYMENT_GATEWAY": "ordora.gateway.FakeGateway", "FLUTTERWAVE_WEBHOOK_SECRET": WEBHOOK_SECRET}
+        if not self.cache:
+            overrides["CACHES"] = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+        with override_settings(**overrides), self.clock.patch(), \
+                mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, throttles_off):
+            scripts = self.plan()
+            if self.concurrency == 1:
+                self.run_client(0, scripts[0], customers, goods_ids)
+            else:
+                with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                    futures = [
+                        pool.submit(self.run_client, i, script, customers, goods_ids)
+                        for i, script in enumerate(scripts)
+                    ]
+                    for future in futures:
+                        future.result()
+        wall = time.perf_counter() - started
+
+        drained = self.drain_webhooks()
+        return self.report(wall, drained)
+
+    def drain_webhooks(self):
+        """Process the webhook events the run queued; reports how fast the worker gets through them."""
+        started = time.perf_counter()
+        processed = 0
+        while True:
+            batch = webhooks.process_batch(100)
+            if not batch:
+                break
+            processed += batch
+        elapsed = time.perf_counter() - started
+        return {
+            "events": processed,
+            "seconds": round(elapsed, 3),
+            "events_per_second": round(processed / elapsed, 1) if processed and elapsed else None,
+        }
+
+    def report(self, wall, drained):
+        scenarios = {}
+        everything = []
+        for scenario, samples in sorted(self.samples.items()):
+            everything.extend(samples)
+            scenarios[scenario] = summarize(samples, wall)
+        return {
+            "meta": environment(),
+            "config": {
+                "requests": self.requests, "concurrency": self.concurrency, "seed": self.seed,
+                "mix": self.mix, "cache": self.cache,
+            },
+            "data": {
+                "goods": Goods.objects.count(),
+                "orders": Order.objects.count(),
+                "payments": Payment.objects.count(),
+            },
+            "wall_seconds": round(wall, 3),
+            "overall": summarize(everything, wall) if everything else None,
+            "scenarios": scenarios,
+            "webhook_processing": drained,
+        }
+
+
+def summarize(samples, wall):
+    latencies = [seconds * 1000 for seconds, *_ in samples]
+    queries = [sample[1] for sample in samples]
+    connect_ms = [sample[4] * 1000 for sample in samples]
+    p50, p95, p99 = percentiles(latencies)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for sample in samples if not sample[2]),
+        "throughput_rps": round(len(samples) / wall, 1) if wall else None,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 2),
+            "p50": round(p50, 2),
+            "p95": round(p95, 2),
+            "p99": round(p99, 2),
+            "max": round(max(latencies), 2),
+        },
+        "queries": {"mean": round(statistics.fmean(queries), 2), "max": max(queries)},
+        # Opening (or checking out) database connections, per request
+        "connections": {
+            "opened": sum(sample[3] for sample in samples),
+            "connect_ms_mean": round(statistics.fmean(connect_ms), 3),
+            "connect_ms_max": round(max(connect_ms), 3),
+        },
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=settings.BASE_DIR, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": timezone.now().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "database_pool": bool(connection.settings_dict["OPTIONS"].get("pool")),
+        "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+        "prepare_threshold": connection.settings_dict["OPTIONS"].get("prepare_threshold"),
+        "machine": platform.machine(),
+    }
+
+
+def write_report(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
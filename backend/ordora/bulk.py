@@ -0,0 +1,190 @@
+"""
+Bulk catalogue import and export for producers, in CSV or NDJSON.
+
+Imports are read row by row from the uploaded file (which Django spools to
+disk past FILE_UPLOAD_MAX_MEMORY_SIZE), validated and upserted on
+(producer, sku) in chunks of settings.CATALOGUE_IMPORT_CHUNK_SIZE, one
+INSERT ... ON CONFLICT DO UPDATE per chunk. Exports stream the producer's
+goods through ordora.exports. Memory use does not grow with the file.
+"""
+import codecs
+import csv
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from .caching import invalidate_goods
+from .exports import FORMATS, encode, rows
+from .models import Goods
+
+COLUMNS = ["sku", "name", "description", "price", "quality"]
+EXPORT_COLUMNS = ["id", *COLUMNS, "image_status"]
+# Written on conflict; created_at and the image are left alone
+UPDATE_FIELDS = ["name", "description", "price", "quality", "updated_at"]
+
+
+NOT_UTF8 = "Not valid UTF-8."
+
+
+class ImportFormatError(ValueError):
+    """
+    The rest of the file can't be read, as opposed to a bad row. `result`
+    holds import_goods' counts for the rows saved before it.
+    """
+    result = None
+
+
+class GoodsImportRowSerializer(serializers.ModelSerializer):
+    """One import row. Every row replaces all of its product's imported fields."""
+    sku = serializers.CharField(max_length=64)
+    quality = serializers.IntegerField(min_value=0)
+
+    class Meta:
+        model = Goods
+        fields = COLUMNS
+        # The (producer, sku) constraint is the upsert key, not an error
+        validators = []
+
+
+def format_for(upload, requested=None):
+    """`requested` if given, else guessed from the file's extension or content type."""
+    if requested:
+        if requested not in FORMATS:
+            raise ImportFormatError(f"Unsupported format {requested!r}; use one of {', '.join(FORMATS)}")
+        return requested
+    name = (upload.name or "").lower()
+    content_type = (upload.content_type or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    return "csv"
+
+
+def _decoded_lines(upload, bad_lines):
+    """
+    The upload's lines as text. A line that isn't UTF-8 is decoded with
+    replacement characters and its number added to `bad_lines`, so one bad
+    byte costs a row rather than the rest of the file.
+    """
+    for number, line in enumerate(upload, 1):
+        if number == 1:
+            line = line.removeprefix(codecs.BOM_UTF8)
+        try:
+            yield line.decode("utf-8")
+        except UnicodeDecodeError:
+            bad_lines.add(number)
+            yield line.decode("utf-8", errors="replace")
+
+
+def read_csv(upload):
+    """Yield (line number, row dict); empty cells count as missing, undecodable rows as invalid."""
+    bad_lines = set()
+    reader = csv.DictReader(_decoded_lines(upload, bad_lines))
+    try:
+        if not reader.fieldnames:
+            raise ImportFormatError("The CSV file has no header row")
+        if bad_lines:
+            raise ImportFormatError(f"Line 1: the header is {NOT_UTF8.lower()}")
+        previous = reader.line_num
+        for row in reader:
+            # A quoted cell can span several lines
+            lines, previous = range(previous + 1, reader.line_num + 1), reader.line_num
+            if bad_lines.intersection(lines):
+                yield reader.line_num, {"__invalid__": NOT_UTF8}
+                continue
+            yield reader.line_num, {
+                key.strip(): value for key, value in row.items() if key and value not in (None, "")
+            }
+    except csv.Error as e:
+        # line_num counts the lines read before the one that failed
+        raise ImportFormatError(f"Line {reader.line_num + 1}: {e}")
+
+
+def read_ndjson(upload):
+    """Yield (line number, row dict); a line that isn't a JSON object is a row error."""
+    bad_lines = set()
+    for number, line in enumerate(_decoded_lines(upload, bad_lines), 1):
+        if number in bad_lines:
+            yield number, {"__invalid__": NOT_UTF8}
+            continue
+        text = line.strip()
+        if not text:
+            continue
+        try:
+            row = json.loads(text, parse_float=Decimal)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else {"__invalid__": "Not a JSON object."}
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+def _upsert(producer, goods_by_sku):
+    goods = list(goods_by_sku.values())
+    with transaction.atomic():
+        Goods.objects.bulk_create(
+            goods,
+            update_conflicts=True,
+            unique_fields=["producer", "sku"],
+            update_fields=UPDATE_FIELDS,
+        )
+        pks = [g.pk for g in goods if g.pk is not None]
+        if len(pks) < len(goods):
+            # Backends without RETURNING on upserts leave pk unset
+            pks = Goods.objects.filter(producer=producer, sku__in=goods_by_sku).values_list("id", flat=True)
+        invalidate_goods(list(pks))
+
+
+def import_goods(producer, rows, chunk_size=None, max_errors=None):
+    """
+    Validate and upsert `rows` ((line, dict) pairs) as `producer`'s goods.
+
+    Valid rows are saved even when others fail. Returns the row counts
+    ("imported" counts distinct SKUs written) and the first `max_errors`
+    row errors as {"line", "sku", "errors"}. When the file turns out to be
+    unreadable part way, the rows before that point are saved and the
+    ImportFormatError carries the counts as `result`.
+    """
+    chunk_size = chunk_size or settings.CATALOGUE_IMPORT_CHUNK_SIZE
+    max_errors = settings.CATALOGUE_IMPORT_MAX_ERRORS if max_errors is None else max_errors
+    validator = GoodsImportRowSerializer()
+    result = {"rows": 0, "imported": 0, "failed": 0, "errors": []}
+    # Keyed by sku, so a sku repeated within a chunk is written once, last row wins
+    goods_by_sku = {}
+
+    def flush():
+        if goods_by_sku:
+            _upsert(producer, goods_by_sku)
+            result["imported"] += len(goods_by_sku)
+            goods_by_sku.clear()
+
+    try:
+        for line, row in rows:
+            result["rows"] += 1
+            try:
+                if "__invalid__" in row:
+                    raise serializers.ValidationError({"non_field_errors": [row["__invalid__"]]})
+                data = validator.run_validation(row)
+            except serializers.ValidationError as e:
+                result["failed"] += 1
+                if len(result["errors"]) < max_errors:
+                    result["errors"].append({"line": line, "sku": row.get("sku"), "errors": e.detail})
+                continue
+            goods_by_sku[data["sku"]] = Goods(producer=producer, **data)
+            if len(goods_by_sku) >= chunk_size:
+                flush()
+    except ImportFormatError as e:
+        flush()
+        e.result = result
+        raise
+    flush()
+    return result
+
+
+def export_goods(producer, file_format):
+    """The producer's goods as CSV or NDJSON lines, oldest first."""
+    goods = Goods.objects.filter(producer=producer).order_by("id")
+    return encode(rows(goods, EXPORT_COLUMNS), EXPORT_COLUMNS, file_format)
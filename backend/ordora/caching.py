@@ -0,0 +1,127 @@
+"""
+Versioned response cache for the goods read endpoints.
+
+Every goods row has a version token in the cache, and so does the
+catalogue as a whole. Writes bump the tokens (`invalidate_goods`); cached
+responses and ETags embed the token, so stale entries are simply never
+looked up again and expire on their own.
+
+Invalidation only reaches other processes through a shared cache (Redis).
+With per-process LocMemCache, commands that write goods refuse to run
+(see ordora.management.worker.SharedCacheMixin) and cached responses live
+for LOCAL_CACHE_SECONDS only.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.response import Response
+
+CATALOGUE_KEY = "goods:version"
+
+
+def _goods_key(pk):
+    return f"goods:{pk}:version"
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        # add() so concurrent first readers agree on one token
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+async def _aversion(key):
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def catalogue_version():
+    return _version(CATALOGUE_KEY)
+
+
+def goods_version(pk):
+    return _version(_goods_key(pk))
+
+
+async def acatalogue_version():
+    return await _aversion(CATALOGUE_KEY)
+
+
+async def agoods_version(pk):
+    return await _aversion(_goods_key(pk))
+
+
+def is_shared():
+    """Whether other processes see this one's cache writes; LocMemCache is private to the process."""
+    return not isinstance(caches["default"], LocMemCache)
+
+
+def response_seconds():
+    """How long to keep a cached goods response."""
+    return settings.GOODS_CACHE_SECONDS if is_shared() else min(settings.GOODS_CACHE_SECONDS, settings.LOCAL_CACHE_SECONDS)
+
+
+def invalidate_goods(pks):
+    """Bump the version of the given goods and of the catalogue, once the current transaction commits."""
+    keys = [CATALOGUE_KEY] + [_goods_key(pk) for pk in pks]
+
+    def bump():
+        version = time.time_ns()
+        cache.set_many({key: version for key in keys}, None)
+
+    transaction.on_commit(bump)
+
+
+def response_key(version, request):
+    """The ETag and response cache key for `request` at `version`."""
+    # Scheme and host too: cached payloads hold absolute URLs (next links, images)
+    digest = hashlib.md5(f"{version}:{request.build_absolute_uri()}".encode()).hexdigest()
+    return f'"{digest}"', f"goods:response:{digest}"
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+class CachedRetrieveMixin:
+    """
+    Serve GET from the response cache, and answer 304 when the client's ETag is current.
+
+    Views implement `cache_version()`. The ETag is derived from that version,
+    so a 304 costs a single cache read and no database or serializer work.
+    """
+
+    def cache_version(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        etag, key = response_key(self.cache_version(), request)
+        if etag_matches(request, etag):
+            return Response(status=304, headers={"ETag": etag})
+
+        data = cache.get(key)
+        if data is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cache.set(key, response.data, response_seconds())
+        else:
+            response = Response(data)
+
+        response["ETag"] = etag
+        return response
@@ -0,0 +1,162 @@
+"""
+Streaming CSV / NDJSON exports of goods, orders and payments.
+
+Rows are `.values()` read through `.iterator(chunk_size=EXPORT_CHUNK_SIZE)`,
+a server-side cursor on PostgreSQL, and encoded line by line into a
+StreamingHttpResponse: the first bytes go out at once and memory stays flat
+however long the history is. Under ASGI the lines are handed over as an
+async iterator (`aiterate`), since Django would otherwise read a sync one
+into a list before sending anything.
+"""
+import csv
+import json
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import OrderItem
+
+FORMATS = ("csv", "ndjson")
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+ORDER_COLUMNS = ["id", "customer", "status", "total_price", "created_at"]
+ITEM_COLUMNS = ["product", "product_name", "product_price", "quality"]
+PAYMENT_COLUMNS = ["id", "order", "reference", "amount", "status", "created_at", "paid_at"]
+
+
+class _Echo:
+    """csv.writer target that hands back each formatted line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+_encoder = DjangoJSONEncoder()
+
+
+def _cell(value):
+    # Dates as in the NDJSON and API output, not str()'s "YYYY-MM-DD HH:MM:SS"
+    return _encoder.default(value) if isinstance(value, datetime) else value
+
+
+def encode(entries, columns, file_format):
+    """Yield `entries` (dicts) as CSV lines with a header, or as NDJSON lines."""
+    if file_format == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for entry in entries:
+            yield writer.writerow([_cell(entry[column]) for column in columns])
+    else:
+        for entry in entries:
+            yield json.dumps(entry, cls=DjangoJSONEncoder) + "\n"
+
+
+async def aiterate(lines):
+    """
+    `lines` as an async iterator, EXPORT_CHUNK_SIZE lines per trip to a
+    thread. The trips are thread-sensitive, so the cursor stays on the
+    thread and connection that opened it.
+    """
+    next_chunk = sync_to_async(lambda: list(islice(lines, settings.EXPORT_CHUNK_SIZE)), thread_sensitive=True)
+    while chunk := await next_chunk():
+        for line in chunk:
+            yield line
+
+
+def streaming_response(lines, file_format, filename, asynchronous=False):
+    """Stream `lines`; pass `asynchronous=True` when the response will be sent by the ASGI handler."""
+    lines = aiterate(iter(lines)) if asynchronous else lines
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[file_format])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{file_format}"'
+    return response
+
+
+def date_range(params, field="created_at"):
+    """
+    Filter kwargs for `start` / `end` (YYYY-MM-DD, inclusive) in `params`.
+
+    Bounds are datetimes in the current time zone, so an index on `field`
+    still applies. Raises ValueError naming the bad parameter.
+    """
+    filters = {}
+    for name, lookup, offset in (("start", "gte", 0), ("end", "lt", 1)):
+        value = params.get(name)
+        if not value:
+            continue
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+        filters[f"{field}__{lookup}"] = timezone.make_aware(datetime.combine(day + timedelta(days=offset), time.min))
+    return filters
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def rows(queryset, columns):
+    """
+    `queryset`'s `columns` as dicts, read in chunks from a server-side cursor.
+
+    Foreign keys are read from their `_id` column and keep the field's name.
+    """
+    fields = {column: queryset.model._meta.get_field(column) for column in columns}
+    names = {f.attname: column for column, f in fields.items() if f.attname != column}
+    values = queryset.values(*[f.attname for f in fields.values()])
+    for row in values.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        for attname, column in names.items():
+            row[column] = row.pop(attname)
+        yield row
+
+
+def orders_with_items(orders):
+    """
+    Yield `orders` as dicts with an "items" list, oldest first.
+
+    Items are loaded with one query per chunk of orders, like
+    OrderSerializer.rows, so only one chunk is ever held in memory.
+    """
+    orders = orders.prefetch_related(None).order_by("created_at", "id")
+    for chunk in chunks(rows(orders, ORDER_COLUMNS), settings.EXPORT_CHUNK_SIZE):
+        items = defaultdict(list)
+        for item in (
+            OrderItem.objects.filter(order_id__in=[row["id"] for row in chunk])
+            .order_by("id")
+            .values("order_id", "product_id", "product__name", "product__price", "quality")
+        ):
+            items[item["order_id"]].append({
+                "product": item["product_id"],
+                "product_name": item["product__name"],
+                "product_price": item["product__price"],
+                "quality": item["quality"],
+            })
+        for row in chunk:
+            row["items"] = items[row["id"]]
+            yield row
+
+
+def encode_orders(orders, file_format):
+    """NDJSON: one order per line with its items. CSV: one line per item, order columns repeated."""
+    entries = orders_with_items(orders)
+    if file_format == "ndjson":
+        return encode(entries, ORDER_COLUMNS, file_format)
+    item_columns = ["order" if c == "id" else c for c in ORDER_COLUMNS] + ITEM_COLUMNS
+    lines = (
+        {**order, "order": order["id"], **item}
+        for order in entries
+        for item in order["items"]
+    )
+    return encode(lines, item_columns, file_format)
+
+
+def encode_payments(payments, file_format):
+    return encode(rows(payments.order_by("created_at", "id"), PAYMENT_COLUMNS), PAYMENT_COLUMNS, file_format)
@@ -0,0 +1,238 @@
+"""
+Payment gateway clients.
+
+Views call `get_gateway()` (or `get_async_gateway()` under ASGI) instead of
+talking HTTP directly. The implementation is chosen by the PAYMENT_GATEWAY /
+PAYMENT_GATEWAY_ASYNC settings, so FakeGateway can stand in for Flutterwave
+in tests and load tests.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from functools import lru_cache
+
+import httpx
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import track_outbound
+
+# Upstream answers worth retrying, with urllib3-style exponential backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_BACKOFF = 0.3
+
+
+class GatewayError(Exception):
+    pass
+
+
+class GatewayUnavailable(GatewayError):
+    """The gateway could not be reached, or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stop calling an upstream that keeps failing.
+
+    After `threshold` consecutive failures the circuit opens and calls fail
+    fast for `reset_after` seconds; then one trial call is let through.
+    """
+
+    def __init__(self, threshold=5, reset_after=30):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_after:
+                raise GatewayUnavailable("Payment gateway circuit is open")
+            # Half-open: allow this call, re-open straight away if it fails
+            self.opened_at = None
+            self.failures = self.threshold - 1
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class FlutterwaveGateway:
+    def __init__(self):
+        self.base_url = settings.FLW_BASE_URL
+        self.timeout = settings.FLW_TIMEOUT
+        self.breaker = CircuitBreaker()
+
+        retry = Retry(
+            total=settings.FLW_MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUSES,
+            # Payment creation is keyed by tx_ref upstream, so it is safe to retry too
+            allowed_methods=["GET", "POST"],
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.FLW_POOL_SIZE, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {settings.FLW_SECRET_KEY}",
+            "Content-Type": "application/json",
+        })
+
+    def request(self, method, path, **kwargs):
+        self.breaker.before_call()
+        try:
+            with track_outbound("flutterwave"):
+                resp = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+                data = resp.json()
+        except (requests.RequestException, ValueError) as e:
+            self.breaker.record_failure()
+            raise GatewayUnavailable(str(e)) from e
+        self.breaker.record_success()
+        return data
+
+    def initialize_payment(self, payload):
+        return self.request("POST", "/payments", json=payload)
+
+    def transactions(self, tx_ref):
+        return self.request("GET", "/transactions", params={"tx_ref": tx_ref})
+
+
+def retry_delay(retry, response):
+    """
+    Seconds to wait before the `retry`th retry (from 1): the response's
+    Retry-After if it gives one in seconds, else the backoff urllib3's Retry
+    uses for the sync client (none before the first retry, then doubling).
+    """
+    retry_after = response.headers.get("Retry-After", "")
+    if retry_after.isdigit():
+        return int(retry_after)
+    return 0 if retry <= 1 else RETRY_BACKOFF * 2 ** (retry - 1)
+
+
+class AsyncFlutterwaveGateway:
+    """
+    FlutterwaveGateway for async views: one pooled httpx.AsyncClient per
+    process. The transport retries failed connections; RETRY_STATUSES
+    answers are retried in `request`, like the sync client's Retry does.
+    """
+
+    def __init__(self, transport=None):
+        self.breaker = CircuitBreaker()
+        self.max_retries = settings.FLW_MAX_RETRIES
+        connect, read = settings.FLW_TIMEOUT
+        # The client ignores its own `limits=` once given a transport
+        transport = transport or httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=settings.FLW_POOL_SIZE),
+            retries=self.max_retries,
+        )
+        self.client = httpx.AsyncClient(
+            base_url=settings.FLW_BASE_URL,
+            timeout=httpx.Timeout(read, connect=connect),
+            transport=transport,
+            headers={
+                "Authorization": f"Bearer {settings.FLW_SECRET_KEY}",
+                "Content-Type": "application/json",
+            },
+        )
+
+    async def request(self, method, path, **kwargs):
+        self.breaker.before_call()
+        try:
+            with track_outbound("flutterwave"):
+                for retry in range(1, self.max_retries + 2):
+                    resp = await self.client.request(method, path, **kwargs)
+                    if resp.status_code not in RETRY_STATUSES:
+                        break
+                    if retry > self.max_retries:
+                        # Out of retries: an HTTPStatusError, handled below
+                        resp.raise_for_status()
+                    await asyncio.sleep(retry_delay(retry, resp))
+                data = resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            self.breaker.record_failure()
+            raise GatewayUnavailable(str(e)) from e
+        self.breaker.record_success()
+        return data
+
+    async def initialize_payment(self, payload):
+        return await self.request("POST", "/payments", json=payload)
+
+    async def transactions(self, tx_ref):
+        return await self.request("GET", "/transactions", params={"tx_ref": tx_ref})
+
+
+class FakeGateway:
+    """
+    In-memory gateway for tests and load tests; no network involved.
+
+    Every payment it initializes is reported as `status` (successful by
+    default), for the amount and currency it was initialized with, when its
+    transactions are looked up. `calls` records every request.
+    """
+
+    def __init__(self, status="successful"):
+        self.status = status
+        self.statuses = {}
+        # tx_ref -> (amount, currency)
+        self.charges = {}
+        self.calls = []
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def initialize_payment(self, payload):
+        with self.lock:
+            self.calls.append(("initialize_payment", payload["tx_ref"]))
+            self.statuses.setdefault(payload["tx_ref"], self.status)
+            self.charges.setdefault(payload["tx_ref"], (payload["amount"], payload["currency"]))
+        return {"status": "success", "data": {"link": f"https://checkout.fake/{payload['tx_ref']}"}}
+
+    def transactions(self, tx_ref):
+        with self.lock:
+            self.calls.append(("transactions", tx_ref))
+            status = self.statuses.get(tx_ref)
+            amount, currency = self.charges.get(tx_ref, (None, None))
+        if status is None:
+            return {"status": "success", "data": []}
+        transaction = {"id": next(self.ids), "tx_ref": tx_ref, "status": status, "amount": amount, "currency": currency}
+        return {"status": "success", "data": [transaction]}
+
+
+class AsyncFakeGateway(FakeGateway):
+    async def initialize_payment(self, payload):
+        return FakeGateway.initialize_payment(self, payload)
+
+    async def transactions(self, tx_ref):
+        return FakeGateway.transactions(self, tx_ref)
+
+
+@lru_cache(maxsize=None)
+def get_gateway():
+    return import_string(settings.PAYMENT_GATEWAY)()
+
+
+@lru_cache(maxsize=None)
+def get_async_gateway():
+    return import_string(settings.PAYMENT_GATEWAY_ASYNC)()
+
+
+@receiver(setting_changed)
+def reset_gateways(setting, **kwargs):
+    if setting.startswith("PAYMENT_GATEWAY") or setting.startswith("FLW_"):
+        get_gateway.cache_clear()
+        get_async_gateway.cache_clear()
@@ -0,0 +1,95 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+def claim(user, key, path):
+    """
+    Record `key` for this request. Returns (record, None) when the request
+    should run, or (None, (data, status)) for the response to send instead.
+    """
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(user=user, key=key, path=path), None
+    except IntegrityError:
+        record = IdempotencyKey.objects.get(user=user, key=key)
+        if record.path != path:
+            return None, ({"error": f"{HEADER} was already used for another request"}, 422)
+        if record.status_code is None:
+            return None, ({"error": f"A request with this {HEADER} is in progress"}, 409)
+        return None, (record.response, record.status_code)
+
+
+def finish(record, response):
+    """Store a successful response for replays; release the key otherwise."""
+    if response is not None and 200 <= response.status_code < 300:
+        record.response = response.data
+        record.status_code = response.status_code
+        record.save(update_fields=["response", "status_code"])
+    else:
+        record.delete()
+
+
+def idempotent(view):
+    """
+    Replay the stored response when a request repeats its Idempotency-Key header.
+
+    Keys are scoped to the requesting user. Only successful responses are
+    stored; a failed attempt releases the key so the client can retry it.
+    Apply below @api_view so the view receives a DRF request.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+
+        user = request.user if request.user.is_authenticated else None
+        record, replay = claim(user, key, request.path)
+        if replay is not None:
+            return Response(*replay)
+
+        response = None
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            finish(record, response)
+        return response
+
+    return wrapper
+
+
+def aidempotent(response_class):
+    """
+    `idempotent` for async views, which set `request.user` themselves and
+    return `response_class` instances carrying their payload as `.data`.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return await view(request, *args, **kwargs)
+
+            user = request.user if request.user.is_authenticated else None
+            # Savepoints and IntegrityError recovery need the sync ORM
+            record, replay = await sync_to_async(claim)(user, key, request.path)
+            if replay is not None:
+                return response_class(*replay)
+
+            response = None
+            try:
+                response = await view(request, *args, **kwargs)
+            finally:
+                await sync_to_async(finish)(record, response)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,61 @@
+"""
+Database-backed job queue helpers.
+
+Queue models (WebhookEvent, MediaJob) share the fields `status`,
+`attempts`, `error`, `available_at` and `processed_at`. Workers lease due
+rows with SELECT ... FOR UPDATE SKIP LOCKED, so several processes can share
+a queue, and a lease that runs out hands the row to another worker.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+# A claimed job is handed to another worker if not finished within this time
+LEASE = timedelta(minutes=5)
+MAX_ATTEMPTS = 8
+
+
+def claim_due(model, batch_size, lease=LEASE):
+    """Lease up to `batch_size` due jobs of `model` to this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            model.objects.select_for_update(skip_locked=True)
+            .filter(status__in=["pending", "processing"], available_at__lte=now)
+            .order_by("available_at")[:batch_size]
+        )
+        for job in jobs:
+            job.status = "processing"
+            job.attempts += 1
+            job.available_at = now + lease
+        model.objects.bulk_update(jobs, ["status", "attempts", "available_at"])
+    return jobs
+
+
+def mark_done(job):
+    job.status = "done"
+    job.error = ""
+    _finish(job)
+
+
+def mark_failed(job, error):
+    job.status = "failed"
+    job.error = error
+    _finish(job)
+
+
+def retry_later(job, error, max_attempts=MAX_ATTEMPTS):
+    """Put `job` back with exponential backoff, or fail it for good once it has used all its attempts."""
+    if job.attempts >= max_attempts:
+        mark_failed(job, error)
+        return
+    job.status = "pending"
+    job.error = error
+    job.available_at = timezone.now() + timedelta(seconds=2 ** job.attempts)
+    _finish(job)
+
+
+def _finish(job):
+    job.processed_at = timezone.now()
+    job.save(update_fields=["status", "error", "available_at", "processed_at"])
@@ -0,0 +1,50 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import ProducerOrder, ProducerWallet
+
+
+def link_order(order, items):
+    """Record which producers sell into `order`, with their share of it. `items` must have products loaded."""
+    shares = defaultdict(lambda: [Decimal("0"), 0])
+    for item in items:
+        share = shares[item.product.producer_id]
+        share[0] += item.unit_price * item.quality
+        share[1] += item.quality
+
+    ProducerOrder.objects.bulk_create([
+        ProducerOrder(
+            producer_id=producer_id,
+            order=order,
+            order_created_at=order.created_at,
+            revenue=revenue,
+            units=units,
+        )
+        for producer_id, (revenue, units) in shares.items()
+    ])
+
+
+def record_paid_orders(order_ids):
+    """Credit each producer's wallet and running totals with their share of newly paid orders."""
+    links = ProducerOrder.objects.filter(order_id__in=order_ids, paid_at__isnull=True)
+    totals = list(
+        links.values("producer_id").annotate(revenue=Sum("revenue"), units=Sum("units"), orders=Count("id"))
+    )
+    if not totals:
+        return
+    links.update(paid_at=timezone.now())
+
+    ProducerWallet.objects.bulk_create(
+        [ProducerWallet(producer_id=row["producer_id"]) for row in totals],
+        ignore_conflicts=True,
+    )
+    for row in totals:
+        ProducerWallet.objects.filter(producer_id=row["producer_id"]).update(
+            balance=F("balance") + row["revenue"],
+            revenue=F("revenue") + row["revenue"],
+            units_sold=F("units_sold") + row["units"],
+            paid_orders=F("paid_orders") + row["orders"],
+        )
@@ -0,0 +1,86 @@
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, plus the record's `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BackgroundStreamHandler(QueueHandler):
+    """
+    Hands records to a queue; a listener thread formats them and writes to stderr.
+
+    Request threads never block on the stream. The formatter set on this
+    handler is used by the listener.
+
+    The listener starts on the first record a process emits, not when
+    settings load: a pre-forking server (gunicorn --preload) configures
+    logging in the master, and threads don't survive fork(), so each worker
+    starts its own listener, with its own queue.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.listener = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+        # A lock copied mid-acquire by fork() would never be released in the child
+        os.register_at_fork(after_in_child=self._forked)
+
+    def _forked(self):
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            # Records the parent had queued are its listener's to write
+            self.queue = queue.SimpleQueue()
+            self.listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def emit(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+    def close(self):
+        # logging.shutdown() calls this at exit: write out what is still queued
+        with self.start_lock:
+            if self.listener is not None and self.pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+        super().close()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # QueueHandler.prepare would format here, in the caller's thread; the listener does it
+        return record
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ordora.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the producer daily sales rollups from every paid order."
+
+    def handle(self, *args, **options):
+        rows = rebuild_rollups()
+        self.stdout.write(f"Wrote {rows} producer-day row(s)")
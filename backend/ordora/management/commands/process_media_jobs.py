@@ -0,0 +1,8 @@
+from ordora.management.worker import WorkerCommand
+from ordora.media import process_batch
+
+
+class Command(WorkerCommand):
+    help = "Upload staged goods images and delete removed ones, in batches."
+    process_batch = staticmethod(process_batch)
+    noun = "media job"
@@ -0,0 +1,8 @@
+from ordora.management.worker import WorkerCommand
+from ordora.webhooks import process_batch
+
+
+class Command(WorkerCommand):
+    help = "Process queued payment webhook events with a pool of worker threads."
+    process_batch = staticmethod(process_batch)
+    noun = "webhook event"
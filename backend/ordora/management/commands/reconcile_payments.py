@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from ordora.management.worker import SharedCacheMixin
+from ordora.reconcile import reconcile_pending
+
+
+class Command(SharedCacheMixin, BaseCommand):
+    help = "Settle pending payments by querying the payment gateway in rate-limited batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--rate", type=float, default=10, help="Maximum gateway lookups per second.")
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--min-age", type=int, default=120, help="Skip payments younger than this many seconds.")
+        parser.add_argument("--interval", type=int, default=0, help="Repeat every N seconds instead of running once.")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = reconcile_pending(
+                batch_size=options["batch_size"],
+                rate=options["rate"],
+                concurrency=options["concurrency"],
+                min_age=timedelta(seconds=options["min_age"]),
+            )
+            self.stdout.write(
+                "Checked {checked} pending payment(s): {paid} paid, {failed} failed, {errors} error(s)".format(**stats)
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
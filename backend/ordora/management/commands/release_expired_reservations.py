@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ordora.management.worker import SharedCacheMixin
+from ordora.stock import release_expired_reservations
+
+
+class Command(SharedCacheMixin, BaseCommand):
+    help = "Return stock held by unpaid orders whose reservation has expired. Run from cron every minute or so."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations(batch_size=options["batch_size"])
+        self.stdout.write(f"Released {released} expired reservation(s)")
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ordora import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay scripted catalogue, order, payment, webhook and login traffic against the seeded "
+        "benchmark data and write latency percentiles, throughput and query counts to a JSON file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests", type=int, default=2000,
+            help="Scenario steps to run; a catalogue page walk or a payment counts as one step but sends two requests.",
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="benchmark-results.json")
+        parser.add_argument(
+            "--scenarios",
+            help=f"Comma-separated subset of the mix to run, keeping its weights ({', '.join(benchmark.MIX)}).",
+        )
+        parser.add_argument(
+            "--no-cache", action="store_true",
+            help="Run with a dummy cache, so every request goes to the database.",
+        )
+
+    def handle(self, *args, **options):
+        mix = benchmark.MIX
+        if options["scenarios"]:
+            names = [name.strip() for name in options["scenarios"].split(",") if name.strip()]
+            unknown = sorted(set(names) - set(benchmark.MIX))
+            if unknown or not names:
+                raise CommandError(f"Unknown scenarios: {', '.join(unknown) or '(none given)'}")
+            mix = {name: benchmark.MIX[name] for name in names}
+        runner = benchmark.Runner(
+            requests=options["requests"], concurrency=options["concurrency"], seed=options["seed"],
+            mix=mix, cache=not options["no_cache"],
+        )
+        try:
+            report = runner.run()
+        except ValueError as e:
+            raise CommandError(str(e))
+        benchmark.write_report(report, options["output"])
+
+        for name, stats in report["scenarios"].items():
+            latency = stats["latency_ms"]
+            self.stdout.write(
+                f"{name:<18} {stats['requests']:>6} req  p50 {latency['p50']:>8} ms  p95 {latency['p95']:>8} ms  "
+                f"p99 {latency['p99']:>8} ms  {stats['queries']['mean']:>6} queries  "
+                f"connect {stats['connections']['connect_ms_mean']:>7} ms  {stats['errors']} errors"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['overall']['requests']} requests in {report['wall_seconds']}s, "
+            f"results written to {options['output']}"
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ordora import benchmark
+
+
+class Command(BaseCommand):
+    help = "Bulk-load seeded synthetic producers, goods, orders and payments for benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--goods", type=int, default=100_000)
+        parser.add_argument("--orders", type=int, default=200_000)
+        parser.add_argument("--producers", type=int, help="Defaults to one per 100 goods.")
+        parser.add_argument("--customers", type=int, help="Defaults to one per 10 orders.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--clear", action="store_true", help="Delete earlier benchmark data first.")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            deleted = benchmark.clear()
+            self.stdout.write(f"Deleted {deleted} row(s) of earlier benchmark data")
+        elif benchmark.exists():
+            raise CommandError("Benchmark data already exists; pass --clear to replace it")
+
+        counts = benchmark.seed(
+            goods=options["goods"],
+            orders=options["orders"],
+            producers=options["producers"],
+            customers=options["customers"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Created " + ", ".join(f"{count} {name}" for name, count in counts.items())
+        ))
@@ -0,0 +1,87 @@
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ordora import caching
+
+
+class SharedCacheMixin:
+    """
+    For commands that change goods outside the web processes. Their
+    cache invalidations only reach the web processes through a shared
+    cache, so they refuse to run on the per-process one unless told to
+    with --local-cache (cached responses then go stale for up to
+    LOCAL_CACHE_SECONDS).
+    """
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        # Here rather than add_arguments, which the commands override
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            "--local-cache", action="store_true",
+            help="Run even though the cache is per-process memory (no REDIS_URL); for development.",
+        )
+        return parser
+
+    def execute(self, *args, **options):
+        if not caching.is_shared() and not options.get("local_cache"):
+            raise CommandError(
+                "The cache is per-process memory, so the web processes would keep serving stale goods. "
+                "Set REDIS_URL, or pass --local-cache to run anyway."
+            )
+        return super().execute(*args, **options)
+
+
+class WorkerCommand(SharedCacheMixin, BaseCommand):
+    """
+    Base for commands that drain a job queue with a pool of threads.
+
+    Subclasses set `process_batch`, a staticmethod that claims and handles one
+    batch and returns how many jobs it handled, and `noun` for the summary.
+    """
+    process_batch = None
+    noun = "job"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--idle-sleep", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain the queue and exit instead of polling forever.")
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.processed = 0
+        self.lock = threading.Lock()
+
+        workers = [
+            threading.Thread(target=self.work, args=(options,), daemon=True)
+            for _ in range(max(options["workers"], 1))
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stop.set()
+            for worker in workers:
+                worker.join()
+
+        self.stdout.write(f"Processed {self.processed} {self.noun}(s)")
+
+    def work(self, options):
+        try:
+            while not self.stop.is_set():
+                handled = self.process_batch(options["batch_size"])
+                with self.lock:
+                    self.processed += handled
+                if not handled:
+                    if options["once"]:
+                        return
+                    self.stop.wait(options["idle_sleep"])
+        finally:
+            # Each thread owns its own database connection
+            connection.close()
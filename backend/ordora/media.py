@@ -0,0 +1,200 @@
+"""
+Background media pipeline for goods images.
+
+Requests only stage the uploaded file on local disk and queue a MediaJob;
+`manage.py process_media_jobs` uploads it to the MEDIA_BACKEND and fills in
+Goods.image. Deletes are queued the same way and sent in batches.
+
+The staged file is only handed over through the filesystem, so the web
+processes and the worker must share MEDIA_STAGING_ROOT (same host, or a shared
+volume). A job whose file is not there fails at once with StagedFileMissing
+instead of retrying for a file that will never appear.
+
+Each upload also yields resized WebP variants (settings.IMAGE_VARIANTS),
+whose URLs are stored in Goods.image_variants for the serializers to pick from.
+"""
+import io
+import logging
+import os
+import uuid
+from functools import lru_cache
+
+import cloudinary.api
+from cloudinary import uploader
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+from .caching import invalidate_goods
+from .jobs import claim_due, mark_done, mark_failed, retry_later
+from .metrics import track_outbound
+from .models import Goods, MediaJob
+
+logger = logging.getLogger(__name__)
+
+
+class StagedFileMissing(Exception):
+    """The worker cannot see the file the web process staged for an upload job."""
+
+# Cloudinary's delete_resources accepts up to 100 public ids per call
+DESTROY_CHUNK = 100
+
+
+class CloudinaryBackend:
+    """Variants are Cloudinary transformations, generated eagerly at upload time."""
+
+    def transformation(self, size):
+        return {
+            "width": size, "height": size, "crop": "limit",
+            "format": "webp", "quality": settings.IMAGE_VARIANT_QUALITY,
+        }
+
+    def upload(self, path):
+        """Upload the file at `path`; returns the Goods.image value and its variant URLs."""
+        eager = [self.transformation(size) for size in settings.IMAGE_VARIANTS.values()]
+        with track_outbound("cloudinary"):
+            image = uploader.upload_image(path, folder="goods", eager=eager)
+        variants = {
+            name: image.build_url(secure=True, **self.transformation(size))
+            for name, size in settings.IMAGE_VARIANTS.items()
+        }
+        variants["original"] = image.build_url(secure=True)
+        return image, variants
+
+    def destroy(self, public_ids):
+        for start in range(0, len(public_ids), DESTROY_CHUNK):
+            with track_outbound("cloudinary"):
+                cloudinary.api.delete_resources(public_ids[start:start + DESTROY_CHUNK])
+
+
+class LocalBackend:
+    """Keeps images under MEDIA_ROOT, so the pipeline runs offline and in tests."""
+
+    def __init__(self):
+        self.storage = FileSystemStorage(location=settings.MEDIA_ROOT)
+
+    def upload(self, path):
+        ext = os.path.splitext(path)[1].lower() or ".jpg"
+        public_id = f"goods/{uuid.uuid4().hex}"
+        with open(path, "rb") as f:
+            original = self.storage.save(f"{public_id}{ext}", f)
+
+        variants = {"original": self.storage.url(original)}
+        with Image.open(path) as source:
+            source = ImageOps.exif_transpose(source)
+            if source.mode not in ("RGB", "RGBA"):
+                source = source.convert("RGBA" if "transparency" in source.info else "RGB")
+            for name, size in settings.IMAGE_VARIANTS.items():
+                variant = source.copy()
+                variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                variant.save(buffer, "WEBP", quality=settings.IMAGE_VARIANT_QUALITY, method=4)
+                saved = self.storage.save(f"{public_id}_{name}.webp", ContentFile(buffer.getvalue()))
+                variants[name] = self.storage.url(saved)
+        return f"image/upload/{public_id}{ext}", variants
+
+    def destroy(self, public_ids):
+        for public_id in public_ids:
+            directory, name = os.path.split(public_id)
+            if not self.storage.exists(directory):
+                continue
+            for filename in self.storage.listdir(directory)[1]:
+                stem = os.path.splitext(filename)[0]
+                if stem == name or stem.startswith(f"{name}_"):
+                    self.storage.delete(os.path.join(directory, filename))
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.MEDIA_BACKEND)()
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    if setting in ("MEDIA_BACKEND", "MEDIA_ROOT", "MEDIA_URL"):
+        get_backend.cache_clear()
+
+
+def staging_storage():
+    return FileSystemStorage(location=settings.MEDIA_STAGING_ROOT)
+
+
+def queue_upload(goods, upload, replaces=None):
+    """
+    Stage an uploaded file for `goods` and mark its image pending.
+
+    `replaces` is the image the upload supersedes; it is deleted only once
+    the new one is in place, so the goods never point at a removed image.
+    """
+    ext = os.path.splitext(upload.name)[1].lower()
+    staged_name = staging_storage().save(f"{uuid.uuid4().hex}{ext}", upload)
+    Goods.objects.filter(pk=goods.pk).update(image_status="pending")
+    goods.image_status = "pending"
+    # A response cached since the goods were saved still has the old status
+    invalidate_goods([goods.pk])
+    MediaJob.objects.create(
+        kind="upload", goods=goods, staged_name=staged_name, public_id=replaces.public_id if replaces else ""
+    )
+
+
+def run_upload(job):
+    staging = staging_storage()
+    if job.goods_id is None:
+        # Goods deleted before its image was processed
+        staging.delete(job.staged_name)
+        return
+    if not staging.exists(job.staged_name):
+        raise StagedFileMissing(
+            f"{job.staged_name} is not in MEDIA_STAGING_ROOT ({staging.location}); "
+            "the worker must share that directory with the web processes"
+        )
+
+    image, variants = get_backend().upload(staging.path(job.staged_name))
+    updated = Goods.objects.filter(pk=job.goods_id).update(
+        image=image, image_variants=variants, image_status="ready"
+    )
+    if not updated:
+        get_backend().destroy([Goods._meta.get_field("image").to_python(image).public_id])
+    elif job.public_id:
+        get_backend().destroy([job.public_id])
+    invalidate_goods([job.goods_id])
+    staging.delete(job.staged_name)
+
+
+def process_batch(batch_size=50):
+    """Claim and run one batch of media jobs; all deletes in it go out in one backend call."""
+    jobs = claim_due(MediaJob, batch_size)
+
+    for job in (j for j in jobs if j.kind == "upload"):
+        try:
+            run_upload(job)
+        except StagedFileMissing as e:
+            logger.error("Media upload %s failed: %s", job.pk, e)
+            mark_failed(job, str(e))
+        except Exception as e:
+            logger.exception("Media upload %s failed (attempt %s)", job.pk, job.attempts)
+            retry_later(job, repr(e))
+        else:
+            mark_done(job)
+            continue
+        if job.status == "failed" and job.goods_id:
+            Goods.objects.filter(pk=job.goods_id).update(image_status="failed")
+            invalidate_goods([job.goods_id])
+
+    destroys = [j for j in jobs if j.kind == "destroy"]
+    if destroys:
+        try:
+            get_backend().destroy([j.public_id for j in destroys])
+        except Exception as e:
+            logger.exception("Media delete batch failed")
+            for job in destroys:
+                retry_later(job, repr(e))
+        else:
+            for job in destroys:
+                mark_done(job)
+
+    return len(jobs)
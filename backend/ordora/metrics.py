@@ -0,0 +1,250 @@
+"""
+In-process request metrics, exposed in Prometheus text format at /metrics.
+
+MetricsMiddleware times every request, counts its database queries and
+their time, and adds up outbound HTTP time reported through
+`track_outbound()`. Each request also gets one structured log line on the
+"ordora.requests" logger. Metrics are per process; scrape every worker.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+request_logger = logging.getLogger("ordora.requests")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.extend(self.render_value(list(zip(self.label_names, key)), value))
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render_value(self, labels, value):
+        return [f"{self.name}{_labels(labels)} {value}"]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # One count per bucket, then sum and total count
+                counts = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render_value(self, labels, counts):
+        lines = [
+            f"{self.name}_bucket{_labels(labels + [('le', bound)])} {count}"
+            for bound, count in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_bucket{_labels(labels + [('le', '+Inf')])} {counts[-1]}")
+        lines.append(f"{self.name}_sum{_labels(labels)} {counts[-2]}")
+        lines.append(f"{self.name}_count{_labels(labels)} {counts[-1]}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ["method", "route", "status"]
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Database queries per request.", ["method", "route"], COUNT_BUCKETS
+)
+DB_TIME = Counter("db_query_seconds_total", "Time spent in database queries.", ["route"])
+OUTBOUND_LATENCY = Histogram(
+    "outbound_request_duration_seconds", "Outbound HTTP call latency.", ["service", "outcome"]
+)
+REGISTRY = [REQUEST_LATENCY, REQUEST_QUERIES, DB_TIME, OUTBOUND_LATENCY]
+
+
+def render():
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "http_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.http_time = 0.0
+
+
+_current = ContextVar("ordora_request_stats", default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Execute wrapper on every connection, adding each query to the current request's stats.
+
+    Installed when a connection is created rather than per request, so it
+    also sees the queries async views run through sync_to_async on another
+    thread; the stats follow the request's context there.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+def install_query_counter(connection):
+    if count_query not in connection.execute_wrappers:
+        # Outermost: connections open on first query, often inside a
+        # connection.execute_wrapper() block, whose exit pops the last wrapper
+        connection.execute_wrappers.insert(0, count_query)
+
+
+@receiver(connection_created)
+def _on_connection_created(sender, connection, **kwargs):
+    install_query_counter(connection)
+
+
+@contextmanager
+def track_outbound(service):
+    """Time an outbound call to `service`, in the metrics and in the current request's totals."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        OUTBOUND_LATENCY.observe(elapsed, service=service, outcome=outcome)
+        stats = _current.get()
+        if stats is not None:
+            stats.http_time += elapsed
+
+
+class MetricsMiddleware:
+    """Sync and async capable, so it doesn't push ASGI requests onto a thread."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, elapsed):
+        match = request.resolver_match
+        route = match.route if match is not None else "unmatched"
+        REQUEST_LATENCY.observe(elapsed, method=request.method, route=route, status=response.status_code)
+        REQUEST_QUERIES.observe(stats.queries, method=request.method, route=route)
+        DB_TIME.inc(stats.db_time, route=route)
+
+        request_logger.info(
+            "%s %s %s", request.method, request.path, response.status_code,
+            extra={
+                "method": request.method,
+                "route": route,
+                "status": response.status_code,
+                "duration_ms": round(elapsed * 1000, 2),
+                "db_queries": stats.queries,
+                "db_ms": round(stats.db_time * 1000, 2),
+                "http_ms": round(stats.http_time * 1000, 2),
+            },
+        )
+
+
+def scrape_allowed(request):
+    """METRICS_TOKEN as a bearer token, or a REMOTE_ADDR in METRICS_ALLOWED_IPS."""
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+    return request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; anyone else gets a 404."""
+    if not scrape_allowed(request):
+        raise Http404
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordora', '0007_payment_paid_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['-created_at', '-id'], name='goods_created_id_idx'),
+        ),
+    ]
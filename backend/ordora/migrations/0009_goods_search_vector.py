@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:55
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Weighted tsvector kept current by a row trigger, so inserts, updates and
+# bulk writes all refresh it without any application round trip.
+CREATE_SEARCH_SQL = """
+CREATE OR REPLACE FUNCTION ordora_goods_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER ordora_goods_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description ON ordora_goods
+    FOR EACH ROW EXECUTE FUNCTION ordora_goods_search_vector_update();
+
+UPDATE ordora_goods SET name = name;
+
+CREATE INDEX goods_search_vector_gin ON ordora_goods USING gin (search_vector);
+"""
+
+DROP_SEARCH_SQL = """
+DROP INDEX IF EXISTS goods_search_vector_gin;
+DROP TRIGGER IF EXISTS ordora_goods_search_vector_trigger ON ordora_goods;
+DROP FUNCTION IF EXISTS ordora_goods_search_vector_update();
+"""
+
+
+def create_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_SEARCH_SQL)
+
+
+def drop_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordora', '0008_goods_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_objects, drop_search_objects),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def backfill_ledger(apps, schema_editor):
+    """Build ledger rows for existing orders and credit producers for orders already paid."""
+    OrderItem = apps.get_model('ordora', 'OrderItem')
+    ProducerOrder = apps.get_model('ordora', 'ProducerOrder')
+    ProducerWallet = apps.get_model('ordora', 'ProducerWallet')
+
+    shares = (
+        OrderItem.objects.values('order_id', 'order__created_at', 'order__status', 'product__producer_id')
+        .annotate(revenue=Sum(F('quality') * F('product__price')), units=Sum('quality'))
+        .order_by('order_id')
+    )
+    batch = []
+    for row in shares.iterator(chunk_size=2000):
+        batch.append(ProducerOrder(
+            producer_id=row['product__producer_id'],
+            order_id=row['order_id'],
+            order_created_at=row['order__created_at'],
+            revenue=row['revenue'],
+            units=row['units'],
+            paid_at=row['order__created_at'] if row['order__status'] != 'PENDING' else None,
+        ))
+        if len(batch) >= 2000:
+            ProducerOrder.objects.bulk_create(batch)
+            batch = []
+    ProducerOrder.objects.bulk_create(batch)
+
+    totals = (
+        ProducerOrder.objects.filter(paid_at__isnull=False)
+        .values('producer_id')
+        .annotate(revenue=Sum('revenue'), units=Sum('units'), orders=Count('id'))
+    )
+    for row in totals:
+        wallet, _ = ProducerWallet.objects.get_or_create(producer_id=row['producer_id'])
+        wallet.balance += row['revenue']
+        wallet.revenue = row['revenue']
+        wallet.units_sold = row['units']
+        wallet.paid_orders = row['orders']
+        wallet.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordora', '0013_payment_status_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producerwallet',
+            name='paid_orders',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='producerwallet',
+            name='revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='producerwallet',
+            name='units_sold',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ProducerOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_created_at', models.DateTimeField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('units', models.PositiveIntegerField()),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='producer_links', to='ordora.order')),
+                ('producer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_links', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producer', '-order_created_at'], name='producer_order_recent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producer', 'order'), name='unique_producer_order')],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
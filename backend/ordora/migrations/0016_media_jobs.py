@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_existing_images_ready(apps, schema_editor):
+    Goods = apps.get_model('ordora', 'Goods')
+    Goods.objects.exclude(image__isnull=True).exclude(image='').update(image_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordora', '0015_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='image_status',
+            field=models.CharField(choices=[('none', 'No image'), ('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='MediaJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('upload', 'Upload'), ('destroy', 'Destroy')], max_length=10)),
+                ('staged_name', models.CharField(blank=True, default='', max_length=255)),
+                ('public_id', models.CharField(blank=True, default='', max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('goods', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='media_jobs', to='ordora.goods')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='media_queue_idx')],
+            },
+        ),
+        migrations.RunPython(mark_existing_images_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordora', '0016_media_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
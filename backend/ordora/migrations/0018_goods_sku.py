@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordora', '0017_goods_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='goods',
+            constraint=models.UniqueConstraint(fields=('producer', 'sku'), name='goods_producer_sku_uniq'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_unit_price(apps, schema_editor):
+    # Orders placed before prices were captured get the product's current price
+    OrderItem = apps.get_model("ordora", "OrderItem")
+    Goods = apps.get_model("ordora", "Goods")
+    OrderItem.objects.filter(unit_price__isnull=True).update(
+        unit_price=Subquery(Goods.objects.filter(pk=OuterRef("product_id")).values("price")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordora', '0018_goods_sku'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_unit_price, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+    ]
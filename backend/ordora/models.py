@@ -1,15 +1,28 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from django.contrib.postgres.search import SearchVectorField
 from cloudinary.models import CloudinaryField
-from cloudinary import uploader
+
+from .caching import invalidate_goods
 
 # Create your models here.
 class Goods(models.Model):
+    # The producer's own stock code; bulk imports upsert on (producer, sku)
+    sku = models.CharField(max_length=64, blank=True, null=True)
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quality = models.PositiveIntegerField(default=1)
     image = CloudinaryField('image', blank=True, null=True)
+    # Uploads finish in the background (ordora.media); the image is empty until "ready"
+    image_status = models.CharField(
+        max_length=10,
+        choices=[("none", "No image"), ("pending", "Pending"), ("ready", "Ready"), ("failed", "Failed")],
+        default="none",
+    )
+    # Resized WebP URLs by size name (settings.IMAGE_VARIANTS), plus "original"
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     producer = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -21,19 +34,50 @@ class Goods(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Maintained by a database trigger on PostgreSQL (migration 0009)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination for the catalogue walks (created_at, id) newest first
+            models.Index(fields=["-created_at", "-id"], name="goods_created_id_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["producer", "sku"], name="goods_producer_sku_uniq"),
+        ]
+
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_goods([self.pk])
     
     def delete(self, *args, **kwargs):
         if self.image:
-            try:
-                # Delete image from Cloudinary
-                uploader.destroy(self.image.public_id)
-            except Exception as e:
-                print("Error deleting image from Cloudinary:", e)
+            # Removed from the media backend by `manage.py process_media_jobs`
+            MediaJob.objects.create(kind="destroy", public_id=self.image.public_id)
+        invalidate_goods([self.pk])
         super().delete(*args, **kwargs)
 
 
+def items_prefetch():
+    # One query for all items of a set of orders, joined to their products
+    return models.Prefetch("items", queryset=OrderItem.objects.select_related("product").order_by("id"))
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        return self.prefetch_related(items_prefetch())
+
+    def for_customer(self, user):
+        return self.filter(customer=user)
+
+    def for_producer(self, user):
+        # One row per (producer, order) in the ledger, so no DISTINCT over items is needed
+        return self.filter(producer_links__producer=user)
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ("PENDING", "Pending"),
@@ -55,6 +99,15 @@ class Order(models.Model):
 
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Stock for the items is held until this time; cleared once paid or released
+    reserved_until = models.DateTimeField(null=True, blank=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "reserved_until"], name="order_reservation_idx"),
+        ]
 
     def calculate_total(self):
         total = sum(
@@ -76,6 +129,13 @@ class OrderItem(models.Model):
     )
     product = models.ForeignKey(Goods, on_delete=models.CASCADE)
     quality = models.PositiveIntegerField(default=1)
+    # The product's price when the order was placed; revenue is counted at this price
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.unit_price = self.product.price
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.product.name} x{self.quality}"
@@ -83,7 +143,7 @@ class OrderItem(models.Model):
 
 class Payment(models.Model):
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="payment")
-    reference = models.CharField(max_length=100)
+    reference = models.CharField(max_length=100, unique=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(
         max_length=20,
@@ -94,10 +154,140 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     paid_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Scanned by the pending-payment reconciler
+            models.Index(fields=["status", "created_at"], name="payment_status_created_idx"),
+        ]
+
+
+class WebhookEvent(models.Model):
+    """Inbox row for a payment-gateway webhook, processed later by `manage.py process_webhooks`."""
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("processing", "Processing"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    received_at = models.DateTimeField(auto_now_add=True)
+    # Next time a worker may pick the event up: retry backoff, or lease expiry while processing
+    available_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="webhook_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} ({self.status})"
+
+
+class MediaJob(models.Model):
+    """Queued image upload or delete, processed by `manage.py process_media_jobs`."""
+    KIND_CHOICES = [("upload", "Upload"), ("destroy", "Destroy")]
+    STATUS_CHOICES = WebhookEvent.STATUS_CHOICES
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    goods = models.ForeignKey(Goods, on_delete=models.SET_NULL, null=True, blank=True, related_name="media_jobs")
+    # File waiting in MEDIA_STAGING_ROOT (uploads)
+    staged_name = models.CharField(max_length=255, blank=True, default="")
+    # Image to remove: by a destroy, or by an upload once its replacement is in place
+    public_id = models.CharField(max_length=255, blank=True, default="")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="media_queue_idx"),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """Response stored for a client-supplied Idempotency-Key, see ordora.idempotency."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    key = models.CharField(max_length=255)
+    path = models.CharField(max_length=255)
+    # Empty until the first request with the key has finished
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_idempotency_key"),
+        ]
+
+
+class ProducerOrder(models.Model):
+    """
+    Ledger row linking a producer to an order containing their goods.
+
+    Written when the order is created (see ordora.ledger); `paid_at` is set
+    when the order's payment completes and the amounts reach the wallet.
+    """
+    producer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="order_links")
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="producer_links")
+    order_created_at = models.DateTimeField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2)
+    units = models.PositiveIntegerField()
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["producer", "order"], name="unique_producer_order"),
+        ]
+        indexes = [
+            models.Index(fields=["producer", "-order_created_at"], name="producer_order_recent_idx"),
+        ]
+
+
+class ProducerSalesDaily(models.Model):
+    """Per-producer sales for one day of paid orders, bucketed by Payment.paid_at (see ordora.analytics)."""
+    producer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["producer", "day"], name="unique_producer_sales_day"),
+        ]
+
+
+class ProducerGoodsDaily(models.Model):
+    """Per-goods daily sales, used for a producer's top goods over any date range."""
+    producer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    product = models.ForeignKey(Goods, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["producer", "day", "product"], name="unique_producer_goods_day"),
+        ]
+
 
 class ProducerWallet(models.Model):
     producer = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Running totals over paid orders, maintained by ordora.ledger
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units_sold = models.PositiveIntegerField(default=0)
+    paid_orders = models.PositiveIntegerField(default=0)
 
     def __str__(self):
-        return f"{self.producer.username} - Balance: {self.balance}"
+        return f"{self.producer.name} - Balance: {self.balance}"
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .gateway import GatewayError, get_async_gateway, get_gateway
+from .models import Payment
+from .stock import confirm_order, confirm_orders
+
+logger = logging.getLogger(__name__)
+
+# Gateway transaction status -> Payment.status
+GATEWAY_STATUSES = {
+    "successful": "paid",
+    "failed": "failed",
+}
+TERMINAL_STATUSES = {"paid": "successful", "failed": "failed"}
+# Every payment is charged in naira, see views.qr_payment_payload
+CURRENCY = "NGN"
+# (status, amount, currency) while the gateway has no transaction yet
+PENDING = ("pending", None, None)
+
+# Threads of one process asking about the same reference share a lock stripe
+_locks = [threading.Lock() for _ in range(64)]
+
+
+def _lock_for(reference):
+    return _locks[zlib.crc32(reference.encode()) % len(_locks)]
+
+
+def parse_transactions(data):
+    """The latest transaction's (status, amount, currency), or PENDING when there is none."""
+    if data.get("status") == "success" and data.get("data"):
+        transaction = data["data"][0]
+        return transaction["status"], transaction.get("amount"), transaction.get("currency")
+    return PENDING
+
+
+def checked_status(payment, transaction):
+    """
+    The gateway status to apply to `payment`, given its parsed transaction.
+
+    A successful charge for another amount or currency counts as failed, as
+    the webhook rejects it, so it never confirms the order.
+    """
+    status, amount, currency = transaction
+    if status != "successful":
+        return status
+    if amount is None or Decimal(str(amount)) != payment.amount or currency != CURRENCY:
+        logger.error(
+            "Payment %s was charged %s %s, expected %s %s",
+            payment.reference, amount, currency, payment.amount, CURRENCY,
+        )
+        return "failed"
+    return status
+
+
+def _wait_for(key, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        status = cache.get(key)
+        if status is not None:
+            return status
+    return PENDING
+
+
+def gateway_status(reference):
+    """
+    The gateway's (status, amount, currency) for `reference`, cached briefly.
+
+    Concurrent polls for the same reference are coalesced: inside a process
+    they queue on a lock, across processes a cache lock lets one caller go
+    upstream while the others wait for its result.
+    """
+    key = f"payment-transaction:{reference}"
+    status = cache.get(key)
+    if status is not None:
+        return status
+
+    with _lock_for(reference):
+        status = cache.get(key)
+        if status is not None:
+            return status
+
+        lock_key = f"{key}:lock"
+        lock_timeout = sum(settings.FLW_TIMEOUT)
+        if not cache.add(lock_key, 1, lock_timeout):
+            return _wait_for(key, lock_timeout)
+        try:
+            status = parse_transactions(get_gateway().transactions(reference))
+            cache.set(key, status, settings.PAYMENT_STATUS_CACHE_SECONDS)
+        finally:
+            cache.delete(lock_key)
+    return status
+
+
+async def _await_for(key, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        status = await cache.aget(key)
+        if status is not None:
+            return status
+    return PENDING
+
+
+async def agateway_status(reference):
+    """
+    gateway_status() for async views, through the async gateway client.
+
+    Waiting callers yield to the event loop instead of holding a thread, so
+    the cache lock alone coalesces them, within a process as across processes.
+    """
+    key = f"payment-transaction:{reference}"
+    status = await cache.aget(key)
+    if status is not None:
+        return status
+
+    lock_key = f"{key}:lock"
+    lock_timeout = sum(settings.FLW_TIMEOUT)
+    if not await cache.aadd(lock_key, 1, lock_timeout):
+        return await _await_for(key, lock_timeout)
+    try:
+        status = parse_transactions(await get_async_gateway().transactions(reference))
+        await cache.aset(key, status, settings.PAYMENT_STATUS_CACHE_SECONDS)
+    finally:
+        await cache.adelete(lock_key)
+    return status
+
+
+def apply_gateway_status(payment, gateway_status):
+    """
+    Record a gateway status on `payment`. Returns False without writing when nothing changed.
+
+    The update is conditional on the status we read, so a webhook that got
+    there first is never overwritten.
+    """
+    new_status = GATEWAY_STATUSES.get(gateway_status, "pending")
+    if new_status == payment.status:
+        return False
+
+    changes = {"status": new_status}
+    if new_status == "paid":
+        changes["paid_at"] = timezone.now()
+
+    with transaction.atomic():
+        if not Payment.objects.filter(pk=payment.pk, status=payment.status).update(**changes):
+            return False
+        for field, value in changes.items():
+            setattr(payment, field, value)
+        if new_status == "paid":
+            confirm_order(payment.order)
+    return True
+
+
+class RateLimiter:
+    """Space calls at least 1/rate seconds apart, across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def pending_payments(older_than, batch_size):
+    """Yield batches of pending payments, oldest first, seeking on (created_at, id) through the status index."""
+    queryset = (
+        Payment.objects.filter(status="pending", created_at__lte=older_than)
+        .order_by("created_at", "id")
+        .only("id", "reference", "amount", "order_id", "created_at")
+    )
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(
+                Q(created_at__gt=last.created_at) | Q(created_at=last.created_at, id__gt=last.id),
+                created_at__gte=last.created_at,
+            )
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+
+
+def apply_batch(results):
+    """Write one batch of gateway answers ({payment: gateway status}) with a few bulk updates."""
+    paid = [p for p, status in results.items() if GATEWAY_STATUSES.get(status) == "paid"]
+    failed = [p for p, status in results.items() if GATEWAY_STATUSES.get(status) == "failed"]
+
+    with transaction.atomic():
+        if paid:
+            Payment.objects.filter(pk__in=[p.pk for p in paid], status="pending").update(
+                status="paid", paid_at=timezone.now()
+            )
+            confirm_orders([p.order_id for p in paid])
+        if failed:
+            Payment.objects.filter(pk__in=[p.pk for p in failed], status="pending").update(status="failed")
+    return len(paid), len(failed)
+
+
+def reconcile_pending(batch_size=100, rate=10, concurrency=4, min_age=timedelta(minutes=2)):
+    """
+    Settle pending payments by asking the gateway about each one.
+
+    Payments younger than `min_age` are left to the webhook. Lookups run
+    `concurrency` at a time but never faster than `rate` per second.
+    Returns counts of payments checked, paid, failed and errored.
+    """
+    limiter = RateLimiter(rate)
+    gateway = get_gateway()
+    stats = {"checked": 0, "paid": 0, "failed": 0, "errors": 0}
+
+    def lookup(payment):
+        limiter.wait()
+        try:
+            return payment, checked_status(payment, parse_transactions(gateway.transactions(payment.reference)))
+        except GatewayError as e:
+            logger.warning("Could not reconcile payment %s: %s", payment.reference, e)
+            return payment, None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for batch in pending_payments(timezone.now() - min_age, batch_size):
+            results = dict(pool.map(lookup, batch))
+            stats["checked"] += len(batch)
+            stats["errors"] += sum(1 for status in results.values() if status is None)
+
+            paid, failed = apply_batch(results)
+            stats["paid"] += paid
+            stats["failed"] += failed
+    return stats
@@ -0,0 +1,87 @@
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from rest_framework.exceptions import ValidationError
+
+
+# Language used for both the stored tsvector (see migration 0009) and the query
+SEARCH_CONFIG = "english"
+
+
+def _decimal_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: "Must be a number."})
+
+
+def _int_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Must be an integer."})
+
+
+def filter_goods(queryset, params):
+    """Apply the facet filters: price range, producer and in-stock."""
+    min_price = _decimal_param(params, "min_price")
+    max_price = _decimal_param(params, "max_price")
+    producer = _int_param(params, "producer")
+
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+    if producer is not None:
+        queryset = queryset.filter(producer_id=producer)
+    if params.get("in_stock") in ("1", "true", "True"):
+        queryset = queryset.filter(quality__gt=0)
+    return queryset
+
+
+def rank_goods(queryset, text):
+    """
+    Restrict to goods matching `text` and order them by relevance.
+
+    PostgreSQL matches against the trigger-maintained, GIN-indexed
+    `search_vector` column. Other backends (SQLite in tests) fall back to
+    case-insensitive substring matching, ranking name hits above description hits.
+    """
+    text = (text or "").strip()
+    if not text:
+        return queryset.order_by("-created_at", "-id")
+
+    if connection.vendor == "postgresql":
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank", "-created_at", "-id")
+        )
+
+    terms = text.split()
+    matches = Q()
+    for term in terms:
+        matches &= Q(name__icontains=term) | Q(description__icontains=term)
+
+    return (
+        queryset.filter(matches)
+        .annotate(rank=Case(
+            When(name__icontains=terms[0], then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ))
+        .order_by("-rank", "-created_at", "-id")
+    )
+
+
+def search_goods(queryset, params):
+    return rank_goods(filter_goods(queryset, params), params.get("q"))
@@ -1,21 +1,245 @@
+from collections import defaultdict
+from decimal import Decimal
+from functools import cached_property, partial
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 from .models import Goods
-from .models import Order, OrderItem, Payment, ProducerWallet
+from .models import Order, OrderItem, Payment, ProducerWallet, items_prefetch
+from .ledger import link_order
+from .media import queue_upload
+from .stock import OutOfStock, item_quantities, reservation_expiry, reserve_stock
+
+
+def requested_fields(request):
+    """The field names in `?fields=a,b` on a read request, or None to keep every field."""
+    if request is None or request.method not in ("GET", "HEAD"):
+        return None
+    raw = request.query_params.get("fields")
+    if not raw:
+        return None
+    return {name.strip() for name in raw.split(",") if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Drops the fields not named in `?fields=` from the output. Unknown names are ignored.
+
+    `optimize_queryset()` then narrows the query to the columns the remaining
+    fields read. A field reading other columns than its source declares
+    them in `field_columns`; an empty list means it reads no column.
+    """
+    field_columns = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = requested_fields(self.context.get("request"))
+        if requested and requested & set(self.fields):
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+    def columns(self):
+        columns = {"id"}
+        for name, field in self.fields.items():
+            if name in self.field_columns:
+                columns.update(self.field_columns[name])
+            else:
+                columns.add(field.source.split(".")[0])
+        return columns
+
+    def optimize_queryset(self, queryset, extra_columns=()):
+        return queryset.only(*self.columns(), *extra_columns)
+
+
+def _from_column(field, column, row):
+    value = row[column]
+    return None if value is None else field.to_representation(value)
+
+
+def _placeholder(row):
+    return None
+
+
+# Fields whose to_representation returns a column value of the right type unchanged
+PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.ReadOnlyField)
+
+
+class ValuesRowsMixin:
+    """
+    Read-only fast path: represent `.values()` rows exactly as `.data` represents instances.
+
+    Each column still goes through its field's `to_representation`, so the
+    output is identical; what is skipped is building model instances and
+    resolving every field through `get_attribute`. Fields that read several
+    columns list them in `field_columns` and implement `from_row(row)`;
+    nested serializers are filled in by `rows()` overrides.
+    """
+    field_columns = {}
+
+    def value_columns(self):
+        columns = {"id"}
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name in self.field_columns:
+                columns.update(self.field_columns[name])
+            elif not isinstance(field, serializers.BaseSerializer):
+                columns.add(field.source.replace(".", "__"))
+        return columns
+
+    def row_converters(self):
+        converters = []
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.BaseSerializer):
+                # Keeps the key in field order; rows() fills in the value
+                converters.append((name, _placeholder))
+            elif hasattr(field, "from_row"):
+                converters.append((name, field.from_row))
+            elif isinstance(field, serializers.RelatedField):
+                # A primary key column is already its own representation
+                converters.append((name, itemgetter(field.source)))
+            elif type(field) in PASSTHROUGH_FIELDS:
+                converters.append((name, itemgetter(field.source.replace(".", "__"))))
+            else:
+                converters.append((name, partial(_from_column, field, field.source.replace(".", "__"))))
+        return converters
+
+    def rows(self, rows):
+        converters = self.row_converters()
+        return [{name: convert(row) for name, convert in converters} for row in rows]
+
+
+class GoodsImageField(serializers.ImageField):
+    """
+    Takes an uploaded file; renders the URL of one WebP variant of the stored image.
+
+    The size is `?image_size=` when valid, else the view's `image_size`
+    ("large" by default). Images without variants fall back to the original.
+    """
+
+    def get_attribute(self, instance):
+        return instance
+
+    @cached_property
+    def image_size(self):
+        request = self.context.get("request")
+        size = request.query_params.get("image_size") if request is not None else None
+        if size in settings.IMAGE_VARIANTS or size == "original":
+            return size
+        return getattr(self.context.get("view"), "image_size", "large")
+
+    def url_for(self, image, variants):
+        url = variants.get(self.image_size) or variants.get("original")
+        if url is None:
+            return super().to_representation(image)
+        request = self.context.get("request")
+        if request is not None and url.startswith("/"):
+            return request.build_absolute_uri(url)
+        return url
+
+    def to_representation(self, goods):
+        return self.url_for(goods.image, goods.image_variants)
+
+    def from_row(self, row):
+        return self.url_for(row["image"], row["image_variants"])
 
-class GoodsSerializer(serializers.ModelSerializer):
-    producer = serializers.ReadOnlyField(source='producer.id')
-    image = serializers.ImageField(required=False, allow_null=True)
+
+class GoodsSerializer(SparseFieldsMixin, ValuesRowsMixin, serializers.ModelSerializer):
+    producer = serializers.ReadOnlyField(source="producer_id")
+    image = GoodsImageField(required=False, allow_null=True)
+    field_columns = {"image": ["image", "image_variants"]}
 
     class Meta:
         model = Goods
-        fields = "__all__"
+        exclude = ["search_vector"]
+        read_only_fields = ["image_status"]
+
+    def validate_sku(self, sku):
+        sku = (sku or "").strip() or None
+        if sku is not None:
+            producer_id = self.instance.producer_id if self.instance else self.context["request"].user.pk
+            clash = Goods.objects.filter(producer_id=producer_id, sku=sku)
+            if self.instance:
+                clash = clash.exclude(pk=self.instance.pk)
+            if clash.exists():
+                raise serializers.ValidationError("You already have goods with this SKU.")
+        return sku
 
     def create(self, validated_data):
         user = self.context['request'].user
-        return Goods.objects.create(producer=user, **validated_data)
-    
+        image = validated_data.pop("image", None)
+        goods = Goods.objects.create(producer=user, **validated_data)
+        if image:
+            queue_upload(goods, image)
+        return goods
+
+    def update(self, instance, validated_data):
+        image = validated_data.pop("image", None)
+        old_image = instance.image
+        goods = super().update(instance, validated_data)
+        if image:
+            queue_upload(goods, image, replaces=old_image)
+        return goods
+
+
+class GoodsSummarySerializer(SparseFieldsMixin, ValuesRowsMixin, serializers.ModelSerializer):
+    """Read-only catalogue row: what the list screens show, nothing more."""
+    producer = serializers.ReadOnlyField(source="producer_id")
+    image = GoodsImageField(read_only=True)
+    field_columns = {"image": ["image", "image_variants"]}
+
+    class Meta:
+        model = Goods
+        fields = ["id", "name", "price", "quality", "image", "image_status", "producer"]
+        read_only_fields = fields
+
+
+def attach_products(orders_data):
+    """
+    Resolve the product ids of every item in `orders_data` with a single query,
+    replacing each item's `product_id` with its `Goods` instance.
+    """
+    items = [item for order_data in orders_data for item in order_data["items"]]
+    ids = {item["product_id"] for item in items}
+    products = Goods.objects.in_bulk(ids)
+
+    missing = sorted(ids - products.keys())
+    if missing:
+        raise serializers.ValidationError({"items": f"Invalid product ids: {missing}"})
+
+    for item in items:
+        item["product"] = products[item.pop("product_id")]
+    return orders_data
+
+
+def create_order(customer, items_data):
+    items = [
+        OrderItem(product=item["product"], quality=item["quality"], unit_price=item["product"].price)
+        for item in items_data
+    ]
+    total = sum((item.unit_price * item.quality for item in items), Decimal("0"))
+
+    try:
+        reserve_stock(item_quantities(items))
+    except OutOfStock as e:
+        raise serializers.ValidationError({"items": f"Insufficient stock for products {e.product_ids}"})
 
-class OrderItemSerializer(serializers.ModelSerializer):
+    order = Order.objects.create(customer=customer, total_price=total, reserved_until=reservation_expiry())
+    for item in items:
+        item.order = order
+    OrderItem.objects.bulk_create(items)
+    link_order(order, items)
+    return order
+
+
+class OrderItemSerializer(ValuesRowsMixin, serializers.ModelSerializer):
+    # Plain id on input so a whole cart resolves in one query (see attach_products)
+    product = serializers.IntegerField(source="product_id")
     product_name = serializers.CharField(source="product.name", read_only=True)
     product_price = serializers.DecimalField(source="product.price", max_digits=10, decimal_places=2, read_only=True)
 
@@ -24,43 +248,80 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ["product_name", "product_price","product", "quality"]
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True)
-    
+class OrderListSerializer(serializers.ListSerializer):
+    """Creates several orders from one POST inside a single transaction."""
+
+    def validate(self, attrs):
+        return attach_products(attrs)
+
+    def create(self, validated_data):
+        customer = self.context["request"].user
+        with transaction.atomic():
+            orders = [create_order(customer, attrs["items"]) for attrs in validated_data]
+        prefetch_related_objects(orders, items_prefetch())
+        return orders
+
+
+class OrderSerializer(SparseFieldsMixin, ValuesRowsMixin, serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, allow_empty=False, max_length=settings.ORDER_MAX_ITEMS)
+    field_columns = {"items": []}
+
     class Meta:
         model = Order
         fields = ["id", "customer", "total_price", "status", "created_at", "items"]
         read_only_fields = ["id", "customer", "total_price", "status", "created_at"]
+        list_serializer_class = OrderListSerializer
+
+    def validate(self, attrs):
+        # Batches resolve products for all orders at once in OrderListSerializer
+        if isinstance(self.parent, serializers.ListSerializer):
+            return attrs
+        return attach_products([attrs])[0]
 
     def create(self, validated_data):
-        items_data = validated_data.pop("items")
         customer = self.context["request"].user
+        with transaction.atomic():
+            order = create_order(customer, validated_data["items"])
+        prefetch_related_objects([order], items_prefetch())
+        return order
 
-        order = Order.objects.create(customer=customer)
-
-        total = 0
-
-        for item in items_data:
-            product = item["product"]
-            quality = item["quality"]
-            
+    def optimize_queryset(self, queryset, extra_columns=()):
+        if "items" not in self.fields:
+            queryset = queryset.prefetch_related(None)
+        return super().optimize_queryset(queryset, extra_columns)
 
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quality=quality,
-                
-            )
+    def items_query(self, rows):
+        # One query for the items of every order, like items_prefetch()
+        return (
+            OrderItem.objects.filter(order_id__in=[row["id"] for row in rows])
+            .order_by("id")
+            .values("order_id", *self.fields["items"].child.value_columns())
+        )
 
-            total += product.price * quality
+    def attach_items(self, rows, data, items):
+        by_order = defaultdict(list)
+        for item, item_data in zip(items, self.fields["items"].child.rows(items)):
+            by_order[item["order_id"]].append(item_data)
+        for row, order_data in zip(rows, data):
+            order_data["items"] = by_order[row["id"]]
+        return data
 
-        order.total_price = total
-        order.save()
+    def rows(self, rows):
+        rows = list(rows)
+        data = super().rows(rows)
+        if "items" not in self.fields:
+            return data
+        return self.attach_items(rows, data, list(self.items_query(rows)))
 
-        return order
+    async def arows(self, rows):
+        """rows() for async views, with the items query through the async ORM."""
+        data = super().rows(rows)
+        if "items" not in self.fields or not rows:
+            return data
+        return self.attach_items(rows, data, [item async for item in self.items_query(rows)])
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(ValuesRowsMixin, serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = ["id", "order", "reference", "amount", "status", "qr_code", "created_at"]
@@ -68,8 +329,8 @@ class PaymentSerializer(serializers.ModelSerializer):
 
 
 class ProducerWalletSerializer(serializers.ModelSerializer):
-    producer_name = serializers.ReadOnlyField(source="producer.username")
+    producer_name = serializers.ReadOnlyField(source="producer.name")
 
     class Meta:
         model = ProducerWallet
-        fields = ["producer", "producer_name", "balance"]
+        fields = ["producer", "producer_name", "balance", "revenue", "units_sold", "paid_orders"]
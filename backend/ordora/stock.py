@@ -0,0 +1,141 @@
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Sum, When
+from django.utils import timezone
+
+from .analytics import record_sales
+from .caching import invalidate_goods
+from .ledger import record_paid_orders
+from .models import Goods, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Insufficient stock for products {self.product_ids}")
+
+
+def reservation_expiry():
+    return timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+
+
+def item_quantities(items):
+    """Sum quantities per product id, merging repeated lines for the same goods."""
+    quantities = Counter()
+    for item in items:
+        quantities[item.product_id] += item.quality
+    return quantities
+
+
+def _per_product(quantities):
+    return Case(*[When(pk=pk, then=qty) for pk, qty in quantities.items()])
+
+
+def reserve_stock(quantities):
+    """
+    Take `quantities` ({product_id: qty}) out of stock in one conditional UPDATE.
+
+    Either every product has enough stock and all are decremented, or
+    OutOfStock is raised and nothing changes. Concurrent callers serialize on
+    the row locks the UPDATE takes, so no decrement is ever lost.
+    """
+    if not quantities:
+        return
+
+    # A partial UPDATE must never commit; callers inside a transaction roll back with it
+    with transaction.atomic(savepoint=False):
+        if len(quantities) > 1:
+            # Lock rows in a fixed order so overlapping carts cannot deadlock
+            list(Goods.objects.select_for_update().filter(pk__in=quantities).order_by("pk").values_list("pk"))
+
+        per_product = _per_product(quantities)
+        updated = Goods.objects.filter(pk__in=quantities, quality__gte=per_product).update(
+            quality=F("quality") - per_product
+        )
+        if updated != len(quantities):
+            short = Goods.objects.filter(pk__in=quantities, quality__lt=per_product).values_list("pk", flat=True)
+            raise OutOfStock(set(short) or set(quantities))
+        invalidate_goods(quantities)
+
+
+def release_stock(quantities):
+    if not quantities:
+        return
+    Goods.objects.filter(pk__in=quantities).update(quality=F("quality") + _per_product(quantities))
+    invalidate_goods(quantities)
+
+
+def confirm_orders(order_ids):
+    """
+    Mark orders paid and make their stock decrements permanent. Returns the ids that were confirmed.
+
+    Orders already paid are skipped, so retried notifications never touch
+    stock twice. If an order's reservation had already expired and been
+    released, its stock is taken again; a shortfall is logged rather than
+    raised because the customer has already paid.
+    """
+    with transaction.atomic():
+        rows = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids)
+            .exclude(status="PAID")
+            .values_list("pk", "reserved_until")
+        )
+        if not rows:
+            return []
+
+        confirmed = [pk for pk, _ in rows]
+        Order.objects.filter(pk__in=confirmed).update(status="PAID", reserved_until=None)
+        record_paid_orders(confirmed)
+        record_sales(confirmed)
+
+        for pk, reserved_until in rows:
+            if reserved_until is not None:
+                continue
+            try:
+                with transaction.atomic():
+                    reserve_stock(item_quantities(OrderItem.objects.filter(order_id=pk)))
+            except OutOfStock as e:
+                logger.error("Order %s paid after its reservation expired: %s", pk, e)
+    return confirmed
+
+
+def confirm_order(order):
+    """Single-order confirm_orders(); returns False if the order was already paid."""
+    if not confirm_orders([order.pk]):
+        return False
+    order.status = "PAID"
+    order.reserved_until = None
+    return True
+
+
+def release_expired_reservations(now=None, batch_size=500):
+    """Return stock held by unpaid orders whose reservation has expired. Returns the number of orders released."""
+    now = now or timezone.now()
+    released = 0
+
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(status="PENDING", reserved_until__lt=now)
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not order_ids:
+                return released
+
+            totals = (
+                OrderItem.objects.filter(order_id__in=order_ids)
+                .values("product_id")
+                .annotate(total=Sum("quality"))
+            )
+            release_stock({row["product_id"]: row["total"] for row in totals})
+            Order.objects.filter(pk__in=order_ids).update(reserved_until=None)
+
+        released += len(order_ids)
@@ -1,3 +1,1300 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import httpx
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from users.models import User
+from users.tokens import ClaimsRefreshToken
+
+from .models import Goods, MediaJob, Order, OrderItem, Payment, ProducerOrder, WebhookEvent
+from .stock import confirm_order, release_expired_reservations, reserve_stock
+from . import async_views, benchmark, caching, exports, media
+from .logs import BackgroundStreamHandler, JSONFormatter
+from .metrics import count_query, install_query_counter, track_outbound
+from .renderers import ORJSONRenderer
+from .serializers import GoodsSerializer, GoodsSummarySerializer, OrderSerializer, PaymentSerializer
+from .views import GoodsListView, MyOrdersExportView
+from .analytics import rebuild_rollups
+from .ledger import link_order
+from .gateway import AsyncFlutterwaveGateway, CircuitBreaker, GatewayUnavailable, get_async_gateway, get_gateway
+from .reconcile import apply_gateway_status, reconcile_pending
+from .webhooks import process_batch
+
+
+class OrderQueryCountTests(TestCase):
+    """Order endpoints must cost a constant number of queries, however many orders and items."""
+
+    def setUp(self):
+        self.customer = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+        self.producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        self.client = APIClient()
+
+    def make_orders(self, count, items_per_order):
+        goods = [
+            Goods.objects.create(name=f"Goods {i}", price=10, quality=100, producer=self.producer)
+            for i in range(items_per_order)
+        ]
+        for _ in range(count):
+            order = Order.objects.create(customer=self.customer, total_price=10 * items_per_order)
+            items = [OrderItem.objects.create(order=order, product=product, quality=1) for product in goods]
+            link_order(order, items)
+        return Order.objects.filter(customer=self.customer).last()
+
+    def test_customer_order_list(self):
+        self.make_orders(count=10, items_per_order=5)
+        self.client.force_authenticate(self.customer)
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/goods/customer/order/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(len(response.data[0]["items"]), 5)
+        self.assertEqual(response.data[0]["items"][0]["product_name"], "Goods 0")
+
+    def test_producer_order_list(self):
+        self.make_orders(count=10, items_per_order=5)
+        self.client.force_authenticate(self.producer)
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/goods/producer/order/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 10)
+
+    def test_sparse_order_list_skips_items(self):
+        self.make_orders(count=10, items_per_order=5)
+        self.client.force_authenticate(self.producer)
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/goods/producer/order/?fields=id,status,created_at")
+
+        self.assertEqual(set(response.data[0]), {"id", "status", "created_at"})
+
+    def test_order_detail(self):
+        order = self.make_orders(count=1, items_per_order=5)
+
+        self.client.force_authenticate(self.customer)
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/goods/customer/order/{order.id}/")
+        self.assertEqual(len(response.data["items"]), 5)
+
+        self.client.force_authenticate(self.producer)
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/goods/producer/order/{order.id}/")
+        self.assertEqual(len(response.data["items"]), 5)
+
+
+class CreateOrderTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+        producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        self.goods = [
+            Goods.objects.create(name=f"Goods {i}", price=i + 1, quality=100, producer=producer)
+            for i in range(50)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_large_order_uses_constant_queries(self):
+        items = [{"product": g.id, "quality": 2} for g in self.goods]
+
+        # products, savepoint, stock lock + update, order + items + ledger inserts, release, items for the response
+        with self.assertNumQueries(9):
+            response = self.client.post("/api/goods/create/order/", {"items": items}, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["items"]), 50)
+        self.assertEqual(response.data["total_price"], f"{2 * sum(range(1, 51))}.00")
+        self.assertEqual(OrderItem.objects.count(), 50)
+
+    def test_batch_of_orders(self):
+        payload = [
+            {"items": [{"product": self.goods[0].id, "quality": 1}]},
+            {"items": [{"product": self.goods[1].id, "quality": 3}, {"product": self.goods[2].id, "quality": 1}]},
+        ]
+        response = self.client.post("/api/goods/create/order/", payload, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([order["total_price"] for order in response.data], ["1.00", "9.00"])
+        self.assertEqual(Order.objects.filter(customer=self.customer).count(), 2)
+
+    def test_unknown_product_rejects_whole_batch(self):
+        payload = [
+            {"items": [{"product": self.goods[0].id, "quality": 1}]},
+            {"items": [{"product": 999999, "quality": 1}]},
+        ]
+        response = self.client.post("/api/goods/create/order/", payload, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+    def test_batch_must_hold_one_to_the_maximum_orders(self):
+        response = self.client.post("/api/goods/create/order/", [], format="json")
+        self.assertEqual(response.status_code, 400)
+
+        order = {"items": [{"product": self.goods[0].id, "quality": 1}]}
+        payload = [order] * (settings.ORDER_BATCH_MAX_ORDERS + 1)
+        response = self.client.post("/api/goods/create/order/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_order_items_are_capped(self):
+        items = [
+            {"product": self.goods[i % len(self.goods)].id, "quality": 1} for i in range(settings.ORDER_MAX_ITEMS + 1)
+        ]
+        response = self.client.post("/api/goods/create/order/", {"items": items}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data["items"]["non_field_errors"],
+            [f"Ensure this field has no more than {settings.ORDER_MAX_ITEMS} elements."],
+        )
+        self.assertFalse(Order.objects.exists())
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+        producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        self.goods = Goods.objects.create(name="Rice", price=10, quality=5, producer=producer)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def order(self, quality):
+        return self.client.post(
+            "/api/goods/create/order/", {"items": [{"product": self.goods.id, "quality": quality}]}, format="json"
+        )
+
+    def test_order_reserves_stock(self):
+        self.assertEqual(self.order(3).status_code, 201)
+        self.goods.refresh_from_db()
+        self.assertEqual(self.goods.quality, 2)
+
+        response = self.order(3)
+        self.assertEqual(response.status_code, 400)
+        self.goods.refresh_from_db()
+        self.assertEqual(self.goods.quality, 2)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_reservation_is_released(self):
+        self.order(3)
+        Order.objects.update(reserved_until=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(release_expired_reservations(), 1)
+        self.goods.refresh_from_db()
+        self.assertEqual(self.goods.quality, 5)
+        self.assertEqual(release_expired_reservations(), 0)
+
+    def test_confirm_keeps_reservation_once(self):
+        self.order(3)
+        order = Order.objects.get()
+
+        self.assertTrue(confirm_order(order))
+        self.assertFalse(confirm_order(order))
+        self.assertEqual(release_expired_reservations(now=timezone.now() + timedelta(days=1)), 0)
+        self.goods.refresh_from_db()
+        self.assertEqual(self.goods.quality, 2)
+
+    def test_confirm_after_release_takes_stock_again(self):
+        self.order(3)
+        order = Order.objects.get()
+        release_expired_reservations(now=timezone.now() + timedelta(days=1))
+
+        confirm_order(order)
+        self.goods.refresh_from_db()
+        self.assertEqual(self.goods.quality, 2)
+
+
+@override_settings(FLUTTERWAVE_WEBHOOK_SECRET="secret")
+class WebhookQueueTests(TestCase):
+    def setUp(self):
+        customer = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+        producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        goods = Goods.objects.create(name="Rice", price=10, quality=1, producer=producer)
+        self.order = Order.objects.create(customer=customer, total_price=20, reserved_until=timezone.now())
+        OrderItem.objects.create(order=self.order, product=goods, quality=2)
+        Payment.objects.create(order=self.order, reference=f"order-{self.order.id}-1", amount=20)
+
+    def deliver(self, amount=20):
+        payload = {
+            "event": "charge.completed",
+            "data": {
+                "id": 4242,
+                "tx_ref": f"order-{self.order.id}-1",
+                "status": "successful",
+                "amount": amount,
+                "currency": "NGN",
+                "meta": {"order_id": self.order.id},
+            },
+        }
+        return self.client.post(
+            "/api/goods/payments/flutterwave/webhook/", payload,
+            content_type="application/json", HTTP_VERIF_HASH="secret",
+        )
+
+    def test_events_are_queued_once_and_processed(self):
+        self.assertEqual(self.deliver().status_code, 200)
+        self.assertEqual(self.deliver().status_code, 200)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "PENDING")
+
+        self.assertEqual(process_batch(), 1)
+        self.assertEqual(process_batch(), 0)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "PAID")
+        self.assertEqual(Payment.objects.get().status, "paid")
+        self.assertEqual(WebhookEvent.objects.get().status, "done")
+
+    def test_rejected_event_is_not_retried(self):
+        self.deliver(amount=5)
+        process_batch()
+
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.status, "failed")
+        self.assertEqual(event.error, "Amount mismatch")
+        self.assertEqual(process_batch(), 0)
+
+    def test_bad_signature(self):
+        response = self.client.post(
+            "/api/goods/payments/flutterwave/webhook/", {}, content_type="application/json", HTTP_VERIF_HASH="nope"
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+
+@override_settings(PAYMENT_GATEWAY="ordora.gateway.FakeGateway")
+class CreatePaymentIdempotencyTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+        self.order = Order.objects.create(customer=self.customer, total_price=20)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.url = f"/api/goods/payments/create-qr/{self.order.id}/"
+        get_gateway.cache_clear()
+
+    def test_repeat_calls_reuse_the_payment(self):
+        first = self.client.post(self.url, HTTP_IDEMPOTENCY_KEY="abc")
+        replay = self.client.post(self.url, HTTP_IDEMPOTENCY_KEY="abc")
+        again = self.client.post(self.url)
+
+        self.assertEqual(len(get_gateway().calls), 1)
+        self.assertEqual(first.data, replay.data)
+        self.assertEqual(first.data["id"], again.data["id"])
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_failed_attempt_releases_the_key(self):
+        with mock.patch.object(get_gateway(), "initialize_payment", return_value={"status": "error"}):
+            self.assertEqual(self.client.post(self.url, HTTP_IDEMPOTENCY_KEY="abc").status_code, 400)
+
+        self.assertEqual(self.client.post(self.url, HTTP_IDEMPOTENCY_KEY="abc").status_code, 200)
+        self.assertEqual(Payment.objects.count(), 1)
+
+
+@override_settings(PAYMENT_GATEWAY_ASYNC="ordora.gateway.AsyncFakeGateway")
+class AsyncViewTests(TestCase):
+    """The async views answer byte for byte what their sync counterparts do."""
+
+    def setUp(self):
+        cache.clear()
+        get_async_gateway.cache_clear()
+        self.customer = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+        self.producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        goods = [
+            Goods.objects.create(name=f"Goods {i}", price=10 + i, quality=100, producer=self.producer)
+            for i in range(25)
+        ]
+        self.goods = goods[0]
+        self.order = Order.objects.create(customer=self.customer, total_price=23)
+        items = [
+            OrderItem.objects.create(order=self.order, product=goods[0], quality=1),
+            OrderItem.objects.create(order=self.order, product=goods[3], quality=1),
+        ]
+        link_order(self.order, items)
+        self.factory = AsyncRequestFactory()
+        self.client = APIClient()
+        self.as_customer = self.bearer(self.customer)
+        self.as_producer = self.bearer(self.producer)
+
+    def bearer(self, user, **headers):
+        # AsyncRequestFactory takes headers only through `headers=`
+        return {"headers": {"Authorization": f"Bearer {ClaimsRefreshToken.for_user(user).access_token}", **headers}}
+
+    async def compare(self, view, url, auth, *args):
+        expected = await sync_to_async(self.client.get)(url, **auth)
+        await cache.aclear()
+        response = await view(self.factory.get(url, **auth), *args)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    async def test_same_responses_as_sync_views(self):
+        first = await self.compare(async_views.goods_list, "/api/goods/?fields=id,name,price", {})
+        next_url = json.loads(first.content)["next"].removeprefix("http://testserver")
+        await self.compare(async_views.goods_list, next_url, {})
+        await self.compare(async_views.goods_detail, f"/api/goods/{self.goods.id}/", self.as_customer, self.goods.id)
+        await self.compare(async_views.goods_detail, "/api/goods/999999/", self.as_customer, 999999)
+        await self.compare(async_views.goods_detail, f"/api/goods/{self.goods.id}/", {}, self.goods.id)
+        await self.compare(async_views.my_orders, "/api/goods/customer/order/", self.as_customer)
+        await self.compare(
+            async_views.my_order_detail, f"/api/goods/customer/order/{self.order.id}/", self.as_customer, self.order.id
+        )
+        await self.compare(async_views.producer_orders, "/api/goods/producer/order/?fields=id,status", self.as_producer)
+        await self.compare(
+            async_views.producer_order_detail, f"/api/goods/producer/order/{self.order.id}/",
+            self.as_producer, self.order.id,
+        )
+
+    async def test_goods_detail_etag(self):
+        url = f"/api/goods/{self.goods.id}/"
+        etag = (await async_views.goods_detail(self.factory.get(url, **self.as_customer), self.goods.id))["ETag"]
+        response = await async_views.goods_detail(
+            self.factory.get(url, **self.bearer(self.customer, **{"If-None-Match": etag})), self.goods.id
+        )
+        self.assertEqual(response.status_code, 304)
+
+    async def test_goods_list_is_cached_per_host(self):
+        url = "/api/goods/?page_size=1"
+        spoofed = self.factory.get(url)
+        spoofed.META["HTTP_HOST"] = "evil.example"
+        await async_views.goods_list(spoofed)
+        response = await async_views.goods_list(self.factory.get(url))
+        self.assertTrue(json.loads(response.content)["next"].startswith("http://testserver/"))
+
+    async def test_payment_flow(self):
+        url = f"/api/goods/payments/create-qr/{self.order.id}/"
+        request = lambda: self.factory.post(url, **self.bearer(self.customer, **{"Idempotency-Key": "abc"}))
+        first = await async_views.create_flutterwave_qr(request(), self.order.id)
+        replay = await async_views.create_flutterwave_qr(request(), self.order.id)
+        self.assertEqual(first.status_code, 200)
+        # Replays come from a JSONField; jsonb does not keep key order
+        self.assertEqual(json.loads(first.content), json.loads(replay.content))
+        self.assertEqual(len(get_async_gateway().calls), 1)
+        reference = json.loads(first.content)["reference"]
+
+        await self.compare(async_views.customer_payments, "/api/goods/customers/payments/", self.as_customer)
+        await self.compare(
+            async_views.payment_by_order, f"/api/goods/payments/{self.order.id}/", self.as_customer, self.order.id
+        )
+
+        status_url = f"/api/goods/payments/status/{reference}/"
+        response = await async_views.payment_status(self.factory.get(status_url, **self.as_customer), reference)
+        self.assertEqual(json.loads(response.content), {"status": "successful", "reference": reference})
+        payment = await Payment.objects.select_related("order").aget(reference=reference)
+        self.assertEqual((payment.status, payment.order.status), ("paid", "PAID"))
+
+
+class CircuitBreakerTests(TestCase):
+    def test_opens_after_repeated_failures(self):
+        breaker = CircuitBreaker(threshold=2, reset_after=60)
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+
+        with self.assertRaises(GatewayUnavailable):
+            breaker.before_call()
+
+    def test_half_open_trial_closes_on_success(self):
+        breaker = CircuitBreaker(threshold=1, reset_after=0)
+        breaker.record_failure()
+
+        breaker.before_call()
+        breaker.record_success()
+        breaker.before_call()
+        self.assertEqual(breaker.failures, 0)
+
+
+class AsyncFlutterwaveGatewayTests(TestCase):
+    def gateway(self, *statuses):
+        answers = iter(statuses)
+        self.calls = 0
+
+        def answer(request):
+            self.calls += 1
+            return httpx.Response(next(answers), json={"status": "success"}, headers={"Retry-After": "0"})
+
+        return AsyncFlutterwaveGateway(transport=httpx.MockTransport(answer))
+
+    def test_pool_size_comes_from_settings(self):
+        pool = AsyncFlutterwaveGateway().client._transport._pool
+        self.assertEqual(pool._max_connections, settings.FLW_POOL_SIZE)
+
+    @override_settings(FLW_MAX_RETRIES=2)
+    def test_retries_throttled_and_failed_answers(self):
+        gateway = self.gateway(503, 429, 200)
+        self.assertEqual(async_to_sync(gateway.transactions)("ref-1"), {"status": "success"})
+        self.assertEqual(self.calls, 3)
+
+    @override_settings(FLW_MAX_RETRIES=1)
+    def test_gives_up_after_max_retries(self):
+        gateway = self.gateway(502, 502, 200)
+        with self.assertRaises(GatewayUnavailable):
+            async_to_sync(gateway.transactions)("ref-1")
+        self.assertEqual((self.calls, gateway.breaker.failures), (2, 1))
+
+
+@override_settings(PAYMENT_GATEWAY="ordora.gateway.FakeGateway")
+class PaymentStatusTests(TestCase):
+    def setUp(self):
+        customer = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+        self.order = Order.objects.create(customer=customer, total_price=20)
+        self.payment = Payment.objects.create(order=self.order, reference="order-1-1", amount=20)
+        self.client = APIClient()
+        self.client.force_authenticate(customer)
+        self.url = "/api/goods/payments/status/order-1-1/"
+        get_gateway.cache_clear()
+        cache.clear()
+
+    def test_polls_are_served_from_cache(self):
+        get_gateway().statuses["order-1-1"] = "pending"
+
+        for _ in range(3):
+            response = self.client.get(self.url)
+            self.assertEqual(response.data["status"], "pending")
+
+        self.assertEqual(len(get_gateway().calls), 1)
+
+    def test_paid_payment_skips_upstream(self):
+        get_gateway().statuses["order-1-1"] = "successful"
+        get_gateway().charges["order-1-1"] = (20.0, "NGN")
+        self.assertEqual(self.client.get(self.url).data["status"], "successful")
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual((self.payment.status, self.order.status), ("paid", "PAID"))
+
+        cache.clear()
+        self.assertEqual(self.client.get(self.url).data["status"], "successful")
+        self.assertEqual(len(get_gateway().calls), 1)
+
+    def test_unchanged_status_is_not_written(self):
+        self.assertFalse(apply_gateway_status(self.payment, "pending"))
+
+    def test_charge_for_the_wrong_amount_does_not_pay(self):
+        get_gateway().statuses["order-1-1"] = "successful"
+        get_gateway().charges["order-1-1"] = (2.0, "NGN")
+        with self.assertLogs("ordora.reconcile", "ERROR"):
+            self.assertEqual(self.client.get(self.url).data["status"], "failed")
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.payment.status, "failed")
+        self.assertNotEqual(self.order.status, "PAID")
+
+
+@override_settings(PAYMENT_GATEWAY="ordora.gateway.FakeGateway")
+class ReconcilerTests(TestCase):
+    def setUp(self):
+        customer = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+        get_gateway.cache_clear()
+        self.payments = []
+        for i, status in enumerate(["successful", "failed", "pending"]):
+            order = Order.objects.create(customer=customer, total_price=20, reserved_until=timezone.now())
+            self.payments.append(Payment.objects.create(order=order, reference=f"order-{order.id}-1", amount=20))
+            get_gateway().statuses[f"order-{order.id}-1"] = status
+            get_gateway().charges[f"order-{order.id}-1"] = (20, "NGN")
+
+    def test_pending_payments_are_settled_in_batches(self):
+        stats = reconcile_pending(batch_size=2, rate=1000, min_age=timedelta(0))
+
+        self.assertEqual(stats, {"checked": 3, "paid": 1, "failed": 1, "errors": 0})
+        statuses = [Payment.objects.get(pk=p.pk).status for p in self.payments]
+        self.assertEqual(statuses, ["paid", "failed", "pending"])
+        self.assertEqual(Order.objects.get(pk=self.payments[0].order_id).status, "PAID")
+
+    def test_mismatched_charges_are_not_settled_as_paid(self):
+        first, second, _ = self.payments
+        get_gateway().charges[first.reference] = (20, "USD")
+        get_gateway().statuses[second.reference] = "successful"
+        get_gateway().charges[second.reference] = (19.99, "NGN")
+
+        with self.assertLogs("ordora.reconcile", "ERROR") as logs:
+            stats = reconcile_pending(rate=1000, min_age=timedelta(0))
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(stats, {"checked": 3, "paid": 0, "failed": 2, "errors": 0})
+        self.assertEqual([Payment.objects.get(pk=p.pk).status for p in self.payments], ["failed", "failed", "pending"])
+        self.assertFalse(Order.objects.filter(status="PAID").exists())
+
+    def test_recent_payments_are_left_to_the_webhook(self):
+        stats = reconcile_pending(min_age=timedelta(hours=1))
+        self.assertEqual(stats["checked"], 0)
+
+
+class ProducerLedgerTests(TestCase):
+    def setUp(self):
+        customer = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+        self.producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        other = User.objects.create_user(email="other@example.com", name="Other", password="pass", role="producer")
+        self.rice = Goods.objects.create(name="Rice", price=10, quality=50, producer=self.producer)
+        self.beans = Goods.objects.create(name="Beans", price=4, quality=50, producer=self.producer)
+        self.yam = Goods.objects.create(name="Yam", price=7, quality=50, producer=other)
+
+        self.client = APIClient()
+        self.client.force_authenticate(customer)
+        items = [
+            {"product": self.rice.id, "quality": 2},
+            {"product": self.beans.id, "quality": 3},
+            {"product": self.yam.id, "quality": 1},
+        ]
+        response = self.client.post("/api/goods/create/order/", {"items": items}, format="json")
+        self.order = Order.objects.get(pk=response.data["id"])
+
+    def test_order_is_linked_once_per_producer(self):
+        link = ProducerOrder.objects.get(producer=self.producer)
+        self.assertEqual((link.order_id, link.revenue, link.units, link.paid_at), (self.order.id, 32, 5, None))
+        self.assertEqual(ProducerOrder.objects.count(), 2)
+
+    def test_payment_credits_wallet_once(self):
+        confirm_order(self.order)
+        confirm_order(self.order)
+
+        self.client.force_authenticate(self.producer)
+        response = self.client.get("/api/goods/producer/wallet/")
+        self.assertEqual(response.data["balance"], "32.00")
+        self.assertEqual(response.data["revenue"], "32.00")
+        self.assertEqual(response.data["units_sold"], 5)
+        self.assertEqual(response.data["paid_orders"], 1)
+
+
+class ProducerAnalyticsTests(TestCase):
+    def setUp(self):
+        customer = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+        self.producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        rice = Goods.objects.create(name="Rice", price=10, quality=50, producer=self.producer)
+        beans = Goods.objects.create(name="Beans", price=4, quality=50, producer=self.producer)
+
+        self.client = APIClient()
+        self.client.force_authenticate(customer)
+        for items in ([(rice, 2), (beans, 1)], [(beans, 5)]):
+            response = self.client.post(
+                "/api/goods/create/order/",
+                {"items": [{"product": g.id, "quality": q} for g, q in items]},
+                format="json",
+            )
+            order = Order.objects.get(pk=response.data["id"])
+            Payment.objects.create(
+                order=order, reference=f"order-{order.id}-1", amount=order.total_price,
+                status="paid", paid_at=timezone.now(),
+            )
+            confirm_order(order)
+        self.client.force_authenticate(self.producer)
+
+    def test_summary(self):
+        response = self.client.get("/api/goods/producer/analytics/?period=month")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["buckets"]), 1)
+        self.assertEqual(response.data["totals"]["revenue"], 44)
+        self.assertEqual(response.data["totals"]["orders"], 2)
+        self.assertEqual(response.data["totals"]["average_order_value"], 22)
+        self.assertEqual([g["name"] for g in response.data["top_goods"]], ["Beans", "Rice"])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        before = self.client.get("/api/goods/producer/analytics/").data
+        rebuild_rollups()
+        self.assertEqual(self.client.get("/api/goods/producer/analytics/").data, before)
+
+    def test_price_change_does_not_reprice_past_sales(self):
+        Goods.objects.filter(producer=self.producer).update(price=99)
+        rebuild_rollups()
+
+        totals = self.client.get("/api/goods/producer/analytics/").data["totals"]
+        self.assertEqual(totals["revenue"], 44)
+        self.assertEqual(totals["revenue"], sum(o.total_price for o in Order.objects.all()))
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get("/api/goods/producer/analytics/?period=year").status_code, 400)
+        self.assertEqual(self.client.get("/api/goods/producer/analytics/?start=soon").status_code, 400)
+
+
+class GoodsSearchTests(TestCase):
+    def setUp(self):
+        self.producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        self.other = User.objects.create_user(email="other@example.com", name="Other", password="pass", role="producer")
+        Goods.objects.create(name="Jollof Rice", description="Party food", price=12, quality=5, producer=self.producer)
+        Goods.objects.create(name="Beans", description="Goes well with rice", price=4, quality=9, producer=self.producer)
+        Goods.objects.create(name="Yam", description="Tuber", price=6, quality=3, producer=self.other)
+        Goods.objects.create(name="Brown Rice", description="Wholegrain", price=30, quality=0, producer=self.other)
+        self.client = APIClient()
+
+    def names(self, query, status=200):
+        response = self.client.get(f"/api/goods/search/?{query}")
+        self.assertEqual(response.status_code, status)
+        return [g["name"] for g in response.data["results"]]
+
+    def test_name_matches_rank_above_description_matches(self):
+        names = self.names("q=rice")
+        self.assertEqual(set(names[:2]), {"Jollof Rice", "Brown Rice"})
+        self.assertEqual(names[2:], ["Beans"])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.names("q=rice+party"), ["Jollof Rice"])
+        self.assertEqual(self.names("q=cassava"), [])
+
+    def test_blank_query_lists_everything_newest_first(self):
+        self.assertEqual(self.names("q=++"), ["Brown Rice", "Yam", "Beans", "Jollof Rice"])
+
+    def test_filters(self):
+        self.assertEqual(self.names("min_price=5&max_price=20"), ["Yam", "Jollof Rice"])
+        self.assertEqual(self.names(f"q=rice&producer={self.other.id}"), ["Brown Rice"])
+        self.assertEqual(set(self.names("q=rice&in_stock=true")), {"Jollof Rice", "Beans"})
+
+    def test_invalid_filters(self):
+        response = self.client.get("/api/goods/search/?min_price=cheap&producer=me")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("min_price", response.data)
+
+    def test_pagination(self):
+        response = self.client.get("/api/goods/search/?page_size=3")
+        self.assertEqual((response.data["count"], len(response.data["results"])), (4, 3))
+        self.assertEqual(self.names("page_size=3&page=2"), ["Jollof Rice"])
+        self.assertEqual(self.client.get("/api/goods/search/?page_size=3&page=3").status_code, 404)
+
+
+class GoodsCursorPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        Goods.objects.bulk_create(
+            Goods(name=f"Goods {n}", price=1, quality=1, producer=producer) for n in range(105)
+        )
+        self.client = APIClient()
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(g["id"] for g in response.data["results"])
+            url = response.data["next"]
+        return ids
+
+    def test_walk_has_no_duplicates_when_created_at_ties(self):
+        # Three runs of identical timestamps, each spanning page boundaries
+        now = timezone.now()
+        for n, goods in enumerate(Goods.objects.order_by("id")):
+            Goods.objects.filter(pk=goods.pk).update(created_at=now - timedelta(minutes=n // 40))
+
+        ids = self.walk("/api/goods/?page_size=7")
+        expected = list(Goods.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(set(ids)), 105)
+
+    def test_invalid_cursor_is_not_found(self):
+        tampered = [base64.urlsafe_b64encode(raw).decode() for raw in (b"yesterday|5", b"2026-01-01T00:00:00+00:00|x")]
+        for cursor in ("not-base64!", *tampered):
+            self.assertEqual(self.client.get(f"/api/goods/?cursor={cursor}").status_code, 404)
+
+    def test_page_size_is_clamped(self):
+        for page_size, expected in (("1000", 100), ("0", 1), ("lots", 20)):
+            response = self.client.get(f"/api/goods/?page_size={page_size}")
+            self.assertEqual(len(response.data["results"]), expected)
+
+
+class GoodsResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        self.goods = Goods.objects.create(name="Rice", price=10, quality=5, producer=self.producer)
+        self.client = APIClient()
+        self.client.force_authenticate(self.producer)
+        self.url = f"/api/goods/{self.goods.id}/"
+
+    def test_repeat_reads_skip_the_database(self):
+        first = self.client.get("/api/goods/")
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/goods/")
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_responses_are_cached_per_host(self):
+        Goods.objects.create(name="Beans", price=4, producer=self.producer)
+        spoofed = self.client.get("/api/goods/?page_size=1", HTTP_HOST="evil.example")
+        self.assertTrue(spoofed.data["next"].startswith("http://evil.example/"))
+
+        response = self.client.get("/api/goods/?page_size=1")
+        self.assertTrue(response.data["next"].startswith("http://testserver/"))
+        self.assertNotEqual(response["ETag"], spoofed["ETag"])
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_invalidate(self):
+        etag = self.client.get(self.url)["ETag"]
+        list_etag = self.client.get("/api/goods/")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock({self.goods.id: 2})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["quality"], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Goods.objects.create(name="Beans", price=4, producer=self.producer)
+        self.assertNotEqual(self.client.get("/api/goods/")["ETag"], list_etag)
+
+    def test_per_process_cache_keeps_responses_briefly(self):
+        self.assertEqual(caching.response_seconds(), settings.LOCAL_CACHE_SECONDS)
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            self.assertEqual(caching.response_seconds(), settings.GOODS_CACHE_SECONDS)
+
+    def test_commands_writing_goods_need_a_shared_cache(self):
+        for command in ("process_webhooks", "process_media_jobs", "release_expired_reservations", "reconcile_payments"):
+            with self.assertRaisesMessage(CommandError, "REDIS_URL"):
+                call_command(command)
+        call_command("release_expired_reservations", local_cache=True, stdout=io.StringIO())
+
+
+class CatalogueImportExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        self.existing = Goods.objects.create(sku="RICE-1", name="Rice", price=10, quality=5, producer=self.producer)
+        self.client = APIClient()
+        self.client.force_authenticate(self.producer)
+
+    def upload(self, name, content, **params):
+        upload = SimpleUploadedFile(name, content if isinstance(content, bytes) else content.encode())
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/goods/me/import/", {"file": upload}, format="multipart", **params)
+
+    @override_settings(CATALOGUE_IMPORT_CHUNK_SIZE=2)
+    def test_csv_import_upserts_and_reports_bad_rows(self):
+        list_etag = self.client.get("/api/goods/")["ETag"]
+        response = self.upload("goods.csv", (
+            "sku,name,price,quality\n"
+            "RICE-1,Rice 50kg,12.50,7\n"
+            "BEANS-1,Beans,4,10\n"
+            "YAM-1,Yam,not-a-price,3\n"
+            ",No sku,1,1\n"
+            "GARRI-1,Garri,2,0\n"
+        ))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["rows"], response.data["imported"], response.data["failed"]), (5, 3, 2))
+        self.assertEqual([(e["line"], e["sku"]) for e in response.data["errors"]], [(4, "YAM-1"), (5, None)])
+        self.assertIn("price", response.data["errors"][0]["errors"])
+
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.price, self.existing.quality), ("Rice 50kg", 12.5, 7))
+        self.assertEqual(Goods.objects.filter(producer=self.producer).count(), 3)
+        self.assertNotEqual(self.client.get("/api/goods/")["ETag"], list_etag)
+
+    def test_ndjson_import(self):
+        response = self.upload("goods.ndjson", (
+            '{"sku": "BEANS-1", "name": "Beans", "price": 4.25, "quality": 10}\n'
+            "\n"
+            "not json\n"
+        ))
+
+        self.assertEqual((response.data["imported"], response.data["failed"]), (1, 1))
+        self.assertEqual(response.data["errors"][0]["line"], 3)
+        self.assertEqual(str(Goods.objects.get(sku="BEANS-1").price), "4.25")
+
+    def test_undecodable_lines_are_row_errors(self):
+        response = self.upload("goods.csv", (
+            b"sku,name,price,quality\n"
+            b"RICE-1,Rice,12.50,7\n"
+            b"BEANS-1,Be\xffans,4,10\n"
+            b"YAM-1,Yam,3,3\n"
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["imported"], response.data["failed"]), (2, 1))
+        self.assertEqual(response.data["errors"][0]["line"], 3)
+
+        response = self.upload("goods.ndjson", b'{"sku": "A", "name": "\xff", "price": 1, "quality": 1}\n')
+        self.assertEqual((response.data["failed"], response.data["errors"][0]["line"]), (1, 1))
+
+    @override_settings(CATALOGUE_IMPORT_CHUNK_SIZE=2)
+    def test_unreadable_file_reports_what_was_saved(self):
+        rows = "".join(f"SKU-{n},Goods {n},1,1\n" for n in range(3))
+        response = self.upload("goods.csv", "sku,name,price,quality\n" + rows + "SKU-X," + "x" * 200_000 + ",1,1\n")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.data["error"].startswith("Line 5:"))
+        self.assertEqual((response.data["rows"], response.data["imported"]), (3, 3))
+        self.assertEqual(Goods.objects.filter(producer=self.producer, sku__startswith="SKU-").count(), 3)
+
+    def test_only_producers_can_import(self):
+        customer = User.objects.create_user(email="c@example.com", name="C", password="pass", role="customer")
+        self.client.force_authenticate(customer)
+        self.assertEqual(self.upload("goods.csv", "sku,name,price,quality\n").status_code, 403)
+
+    def test_export_streams_csv_and_ndjson(self):
+        Goods.objects.create(name="Other", price=1, producer=User.objects.create_user(
+            email="other@example.com", name="Other", password="pass", role="producer"
+        ))
+
+        response = self.client.get("/api/goods/me/export/")
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, ["id,sku,name,description,price,quality,image_status",
+                                 f"{self.existing.id},RICE-1,Rice,,10.00,5,none"])
+
+        response = self.client.get("/api/goods/me/export/?type=ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        entry = json.loads(b"".join(response.streaming_content))
+        self.assertEqual((entry["sku"], entry["price"]), ("RICE-1", "10.00"))
+
+    def test_sku_is_unique_per_producer(self):
+        response = self.client.post("/api/goods/create/", {"sku": "RICE-1", "name": "Rice", "price": "3"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("sku", response.data)
+
+
+class HistoryExportTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+        self.producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        rice = Goods.objects.create(name="Rice", price=10, quality=100, producer=self.producer)
+        beans = Goods.objects.create(name="Beans", price=4, quality=100, producer=self.producer)
+        self.orders = []
+        for days_ago in (40, 10, 0):
+            order = Order.objects.create(customer=self.customer, total_price=18)
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+            items = [
+                OrderItem.objects.create(order=order, product=rice, quality=1),
+                OrderItem.objects.create(order=order, product=beans, quality=2),
+            ]
+            link_order(order, items)
+            Payment.objects.create(order=order, reference=f"ref-{order.pk}", amount=18)
+            self.orders.append(order)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def lines(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode().splitlines()
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_order_csv_has_a_line_per_item(self):
+        lines = self.lines("/api/goods/customer/order/export/")
+        self.assertEqual(lines[0], "order,customer,status,total_price,created_at,product,product_name,product_price,quality")
+        self.assertEqual(len(lines), 1 + 3 * 2)
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], [str(o.id) for o in self.orders for _ in "ab"])
+        self.assertTrue(lines[1].endswith(",Rice,10.00,1"))
+
+    def test_order_ndjson_with_date_range(self):
+        start = (timezone.localdate() - timedelta(days=20)).isoformat()
+        orders = [json.loads(line) for line in self.lines(f"/api/goods/customer/order/export/?type=ndjson&start={start}")]
+        self.assertEqual([o["id"] for o in orders], [o.id for o in self.orders[1:]])
+        self.assertEqual([i["product_name"] for i in orders[0]["items"]], ["Rice", "Beans"])
+        self.assertEqual(orders[0]["total_price"], "18.00")
+
+        end = (timezone.localdate() - timedelta(days=10)).isoformat()
+        lines = self.lines(f"/api/goods/customer/order/export/?type=ndjson&start={start}&end={end}")
+        self.assertEqual([json.loads(line)["id"] for line in lines], [self.orders[1].id])
+
+    @override_settings(EXPORT_CHUNK_SIZE=3)
+    def test_async_stream_reads_chunk_by_chunk(self):
+        pulled = []
+
+        def lines():
+            for n in range(10):
+                pulled.append(n)
+                yield f"{n}\n"
+
+        response = exports.streaming_response(lines(), "csv", "numbers", asynchronous=True)
+        self.assertTrue(response.is_async)
+        async def first():
+            return await anext(aiter(response))
+
+        self.assertEqual(async_to_sync(first)(), b"0\n")
+        # Only the first chunk has been read, not the whole export
+        self.assertEqual(pulled, [0, 1, 2])
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_under_asgi_streams_asynchronously(self):
+        url = "/api/goods/customer/order/export/"
+        token = ClaimsRefreshToken.for_user(self.customer).access_token
+        response = MyOrdersExportView.as_view()(AsyncRequestFactory().get(url, headers={"Authorization": f"Bearer {token}"}))
+        self.assertTrue(response.is_async)
+
+        async def content():
+            return b"".join([part async for part in response])
+
+        self.assertEqual(async_to_sync(content)().decode().splitlines(), self.lines(url))
+
+    def test_producer_orders_and_payments(self):
+        self.client.force_authenticate(self.producer)
+        self.assertEqual(len(self.lines("/api/goods/producer/order/export/?type=ndjson")), 3)
+        self.assertEqual(self.lines("/api/goods/customers/payments/export/"), ["id,order,reference,amount,status,created_at,paid_at"])
+
+        self.client.force_authenticate(self.customer)
+        payments = self.lines("/api/goods/customers/payments/export/")
+        self.assertEqual(len(payments), 4)
+        self.assertTrue(payments[1].startswith(f"{self.orders[0].payment.id},{self.orders[0].id},ref-"))
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get("/api/goods/customer/order/export/?start=yesterday").status_code, 400)
+        self.assertEqual(self.client.get("/api/goods/customer/order/export/?type=xml").status_code, 400)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        self.goods = Goods.objects.create(
+            name="Rice", description="Long grain " * 100, price=10, quality=5, producer=producer
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(producer)
+
+    def test_list_uses_the_summary_representation(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/goods/")
+
+        self.assertEqual(
+            set(response.data["results"][0]),
+            {"id", "name", "price", "quality", "image", "image_status", "producer"},
+        )
+        self.assertEqual(response.data["results"][0]["producer"], self.goods.producer_id)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("description", queries[0]["sql"])
+
+    def test_fields_param_limits_output_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/goods/{self.goods.id}/?fields=id,name,bogus")
+
+        self.assertEqual(response.data, {"id": self.goods.id, "name": "Rice"})
+        self.assertNotIn("price", queries[0]["sql"])
+
+    def test_unknown_fields_only_are_ignored(self):
+        response = self.client.get(f"/api/goods/{self.goods.id}/?fields=bogus")
+        self.assertIn("description", response.data)
+
+
+class ValuesFastPathTests(TestCase):
+    """rows() over .values() must produce byte-for-byte what the serializers and JSONRenderer do."""
+
+    def setUp(self):
+        cache.clear()
+        self.producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        self.customer = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+        self.goods = [
+            Goods.objects.create(
+                name="Garri – ẹ̀gúsí", description="Yellow", price="1250.50", quality=3, producer=self.producer,
+                image_status="ready",
+                image_variants={"original": "/media/goods/a.jpg", "small": "/media/goods/a_small.webp"},
+            ),
+            Goods.objects.create(name="Rice", price=10, producer=self.producer),
+        ]
+        order = Order.objects.create(customer=self.customer, total_price="1260.50")
+        for goods in self.goods:
+            OrderItem.objects.create(order=order, product=goods, quality=2)
+        Order.objects.create(customer=self.customer, total_price=0)
+        Payment.objects.create(order=order, reference="order-1", amount="1260.50", qr_code="https://pay/1")
+
+    def assertSameOutput(self, serializer_class, queryset, path="/", view=None):
+        request = Request(APIRequestFactory().get(path))
+        context = {"request": request, "view": view}
+        expected = JSONRenderer().render(serializer_class(queryset, many=True, context=context).data)
+
+        serializer = serializer_class(context=context)
+        rows = serializer.rows(queryset.values(*serializer.value_columns()))
+        self.assertEqual(ORJSONRenderer().render(rows), expected)
+
+    def test_goods(self):
+        queryset = Goods.objects.order_by("id")
+        self.assertSameOutput(GoodsSerializer, queryset)
+        self.assertSameOutput(GoodsSummarySerializer, queryset, view=GoodsListView())
+        self.assertSameOutput(GoodsSummarySerializer, queryset, "/?image_size=original&fields=id,image")
+
+    def test_orders(self):
+        queryset = Order.objects.order_by("id").with_items()
+        self.assertSameOutput(OrderSerializer, queryset)
+        self.assertSameOutput(OrderSerializer, queryset, "/?fields=items,status")
+
+    def test_payments(self):
+        self.assertSameOutput(PaymentSerializer, Payment.objects.order_by("id"))
+
+    def test_list_endpoints(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+        response = self.client.get("/api/goods/customer/order/")
+        orders = Order.objects.for_customer(self.customer).with_items()
+        data = OrderSerializer(orders, many=True, context={"request": Request(response.wsgi_request)}).data
+        self.assertEqual(response.content, JSONRenderer().render(data))
+
+        response = self.client.get("/api/goods/customers/payments/")
+        self.assertEqual(response.json()[0]["reference"], "order-1")
+
+
+@override_settings(MEDIA_BACKEND="ordora.media.LocalBackend")
+class MediaPipelineTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, MEDIA_STAGING_ROOT=f"{self.media_root}/staging")
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.producer = User.objects.create_user(
+            email="producer@example.com", name="Producer", password="pass", role="producer"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.producer)
+
+    def image(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (40, 30), "green").save(buffer, "JPEG")
+        return SimpleUploadedFile("rice.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+    def test_upload_is_deferred_to_the_worker(self):
+        response = self.client.post(
+            "/api/goods/create/", {"name": "Rice", "price": "10.00", "image": self.image()}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["image_status"], "pending")
+        self.assertIsNone(response.data["image"])
+
+        self.assertEqual(media.process_batch(), 1)
+        goods = Goods.objects.get()
+        self.assertEqual(goods.image_status, "ready")
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, f"{goods.image.public_id}.jpg")))
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "staging")), [])
+
+    def test_replaced_image_is_removed_once_the_new_one_is_ready(self):
+        self.client.post("/api/goods/create/", {"name": "Rice", "price": "10.00", "image": self.image()})
+        media.process_batch()
+        goods = Goods.objects.get()
+        old_file = os.path.join(self.media_root, f"{goods.image.public_id}.jpg")
+        update_url = f"/api/goods/{goods.id}/update/"
+
+        # Failed replacement: the goods keep the old image, which must survive
+        self.client.patch(update_url, {"image": self.image()}, format="multipart")
+        shutil.rmtree(os.path.join(self.media_root, "staging"))
+        with self.assertLogs("ordora.media", "ERROR"):
+            media.process_batch()
+        self.assertEqual(Goods.objects.get().image.public_id, goods.image.public_id)
+        self.assertTrue(os.path.exists(old_file))
+
+        self.client.patch(update_url, {"image": self.image()}, format="multipart")
+        self.assertTrue(os.path.exists(old_file))
+        media.process_batch()
+        replaced = Goods.objects.get()
+        self.assertEqual(replaced.image_status, "ready")
+        self.assertNotEqual(replaced.image.public_id, goods.image.public_id)
+        self.assertFalse(os.path.exists(old_file))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, f"{replaced.image.public_id}.jpg")))
+
+    def test_missing_staged_file_fails_the_job_at_once(self):
+        self.client.post("/api/goods/create/", {"name": "Rice", "price": "10.00", "image": self.image()})
+        # A worker on another host, without the web process's staging directory
+        shutil.rmtree(os.path.join(self.media_root, "staging"))
+
+        with self.assertLogs("ordora.media", "ERROR"):
+            self.assertEqual(media.process_batch(), 1)
+        job = MediaJob.objects.get()
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("MEDIA_STAGING_ROOT", job.error)
+        self.assertEqual(Goods.objects.get().image_status, "failed")
+
+    def test_queueing_an_upload_invalidates_cached_responses(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            goods = Goods.objects.create(name="Rice", price=10, producer=self.producer)
+        url = f"/api/goods/{goods.id}/"
+        self.assertEqual(self.client.get(url).data["image_status"], "none")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            media.queue_upload(goods, self.image())
+        self.assertEqual(self.client.get(url).data["image_status"], "pending")
+
+    def test_deletes_are_queued_and_batched(self):
+        for name in ("Rice", "Beans"):
+            self.client.post("/api/goods/create/", {"name": name, "price": "1.00", "image": self.image()})
+        media.process_batch()
+        files = os.listdir(os.path.join(self.media_root, "goods"))
+        # Original plus one WebP per variant size
+        per_image = 1 + len(settings.IMAGE_VARIANTS)
+        self.assertEqual(len(files), 2 * per_image)
+
+        for goods in Goods.objects.all():
+            self.assertEqual(self.client.delete(f"/api/goods/{goods.id}/delete/").status_code, 204)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, "goods"))), 2 * per_image)
+
+        with mock.patch.object(media.LocalBackend, "destroy", wraps=media.get_backend().destroy) as destroy:
+            self.assertEqual(media.process_batch(), 2)
+        destroy.assert_called_once()
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "goods")), [])
+
+    def test_variants_are_resized_webp_and_picked_per_view(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (2000, 1000), "green").save(buffer, "JPEG")
+        upload = SimpleUploadedFile("rice.jpg", buffer.getvalue(), content_type="image/jpeg")
+        self.client.post("/api/goods/create/", {"name": "Rice", "price": "10.00", "image": upload})
+        with self.captureOnCommitCallbacks(execute=True):
+            media.process_batch()
+
+        goods = Goods.objects.get()
+        self.assertEqual(set(goods.image_variants), {"original", *settings.IMAGE_VARIANTS})
+        for name, size in settings.IMAGE_VARIANTS.items():
+            path = os.path.join(self.media_root, goods.image_variants[name].removeprefix(settings.MEDIA_URL))
+            with Image.open(path) as variant:
+                self.assertEqual(variant.format, "WEBP")
+                self.assertEqual(variant.size, (size, size // 2))
+
+        listed = self.client.get("/api/goods/").data["results"][0]
+        self.assertEqual(listed["image"], f"http://testserver{goods.image_variants['small']}")
+        detail = self.client.get(f"/api/goods/{goods.id}/").data
+        self.assertEqual(detail["image"], f"http://testserver{goods.image_variants['large']}")
+        thumb = self.client.get(f"/api/goods/{goods.id}/?image_size=thumb").data
+        self.assertEqual(thumb["image"], f"http://testserver{goods.image_variants['thumb']}")
+
+
+class MetricsTests(TestCase):
+    @override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"])
+    def test_requests_are_timed_and_exposed(self):
+        cache.clear()
+        self.client.get("/api/goods/")
+        with track_outbound("flutterwave"):
+            pass
+
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="api/goods/",status="200",le="+Inf"}', body)
+        self.assertIn('http_request_db_queries_count{method="GET",route="api/goods/"}', body)
+        self.assertIn('db_query_seconds_total{route="api/goods/"}', body)
+        self.assertIn('outbound_request_duration_seconds_count{service="flutterwave",outcome="ok"}', body)
+
+    @override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"])
+    def test_metrics_are_served_to_allowed_addresses_only(self):
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="203.0.113.5").status_code, 404)
+
+    @override_settings(METRICS_TOKEN="scrape-token")
+    def test_metrics_need_the_token_by_default(self):
+        # Behind a local reverse proxy every client is 127.0.0.1
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 404)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-token").status_code, 200)
+
+    def test_query_counter_leaves_scoped_wrappers_alone(self):
+        def scoped(execute, *args):
+            return execute(*args)
+
+        unopened = connections.create_connection(DEFAULT_DB_ALIAS)
+        with unopened.execute_wrapper(scoped):
+            # What connection_created does when the block's first query connects
+            install_query_counter(unopened)
+        self.assertEqual(unopened.execute_wrappers, [count_query])
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs fork()")
+    def test_log_listener_starts_in_forked_workers(self):
+        read, write = os.pipe()
+        handler = BackgroundStreamHandler(os.fdopen(write, "w"))
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.assertIsNone(handler.listener)
+        handler.handle(logging.makeLogRecord({"msg": "master"}))
+
+        pid = os.fork()
+        if pid == 0:
+            handler.handle(logging.makeLogRecord({"msg": "worker"}))
+            handler.close()
+            handler.target.flush()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        handler.close()
+        handler.target.stream.close()
+        with os.fdopen(read) as output:
+            self.assertEqual(sorted(output.read().split()), ["master", "worker"])
+
+    def test_request_log_line_is_structured(self):
+        with self.assertLogs("ordora.requests", "INFO") as logs:
+            self.client.get("/api/goods/")
+        entry = json.loads(JSONFormatter().format(logs.records[0]))
+        self.assertEqual(entry["route"], "api/goods/")
+        self.assertEqual(entry["status"], 200)
+        self.assertIn("db_queries", entry)
+
+
+class BenchmarkTests(TestCase):
+    def test_seed_and_scripted_run(self):
+        cache.clear()
+        counts = benchmark.seed(goods=30, orders=20, seed=1, batch_size=8)
+        self.assertEqual(counts["goods"], 30)
+        self.assertEqual(Order.objects.count(), 20)
+        self.assertEqual(OrderItem.objects.count(), counts["items"])
+        self.assertTrue(benchmark.exists())
+
+        report = benchmark.Runner(requests=20, concurrency=1, seed=1).run()
+        self.assertEqual(report["overall"]["errors"], 0)
+        self.assertGreaterEqual(report["overall"]["requests"], 20)
+        self.assertEqual(set(report["overall"]["latency_ms"]), {"mean", "p50", "p95", "p99", "max"})
+
+        with tempfile.NamedTemporaryFile("r", suffix=".json") as f:
+            benchmark.write_report(report, f.name)
+            self.assertEqual(json.load(f)["config"]["requests"], 20)
+
+        benchmark.clear()
+        self.assertFalse(Goods.objects.exists())
+
+    def test_catalogue_run_without_cache_reports_connections(self):
+        benchmark.seed(goods=30, orders=5, seed=2, batch_size=8)
+        mix = {"catalogue_list": 1, "goods_detail": 1}
+
+        report = benchmark.Runner(requests=10, concurrency=1, seed=2, mix=mix, cache=False).run()
+        self.assertEqual(set(report["scenarios"]), set(mix))
+        self.assertFalse(report["config"]["cache"])
+        self.assertIn("database_pool", report["meta"])
+        for stats in report["scenarios"].values():
+            self.assertEqual(stats["errors"], 0)
+            # No cached responses: every request reads the database
+            self.assertGreaterEqual(stats["queries"]["mean"], 1)
+            self.assertEqual(set(stats["connections"]), {"opened", "connect_ms_mean", "connect_ms_max"})
@@ -1,28 +1,59 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
-    GoodsListView, GoodsCreateView, GoodsDetailView,
-    GoodsUpdateView, GoodsDeleteView, MyGoodsView, CreateOrderView, ProducerOrderView, ProducerOrderDetailView,
+    GoodsListView, GoodsSearchView, GoodsCreateView, GoodsDetailView,
+    GoodsUpdateView, GoodsDeleteView, MyGoodsView, GoodsImportView, GoodsExportView, CreateOrderView, ProducerOrderView, ProducerOrderDetailView,
     MyOrdersView, CreateOrderView, create_flutterwave_qr, flutterwave_callback, flutterwave_webhook, MyOrderDetailView, get_payment_by_order,
-    get_customer_qr_payments, payment_status
+    get_customer_qr_payments, payment_status, ProducerWalletView, producer_analytics,
+    MyOrdersExportView, ProducerOrdersExportView, CustomerPaymentsExportView,
 )
 
 urlpatterns = [
     path('', GoodsListView.as_view(), name='goods-list'),
+    path('search/', GoodsSearchView.as_view(), name='goods-search'),
     path('create/', GoodsCreateView.as_view(), name='goods-create'),
     path('me/', MyGoodsView.as_view(), name='my-goods'),
+    path('me/import/', GoodsImportView.as_view(), name='goods-import'),
+    path('me/export/', GoodsExportView.as_view(), name='goods-export'),
     path('<int:pk>/', GoodsDetailView.as_view(), name='goods-detail'),
     path('<int:pk>/update/', GoodsUpdateView.as_view(), name='goods-update'),
     path('<int:pk>/delete/', GoodsDeleteView.as_view(), name='goods-delete'),
     path('create/order/', CreateOrderView.as_view(), name='order_create'),
     path('producer/order/', ProducerOrderView.as_view(), name='producer_order'),
     path('producer/order/<int:pk>/', ProducerOrderDetailView.as_view(), name='producer_order_detail'),
+    path('producer/order/export/', ProducerOrdersExportView.as_view(), name='producer_order_export'),
+    path('producer/wallet/', ProducerWalletView.as_view(), name='producer_wallet'),
+    path('producer/analytics/', producer_analytics, name='producer_analytics'),
     path('customer/order/', MyOrdersView.as_view(), name='customer_order'),
+    path('customer/order/export/', MyOrdersExportView.as_view(), name='customer_order_export'),
     path("customer/order/<int:pk>/", MyOrderDetailView.as_view(), name="order-detail"),
     path('create/order/', CreateOrderView.as_view(), name='order-create'),
     path("payments/create-qr/<int:order_id>/", create_flutterwave_qr, name="create_qr_payment"),
     path("payments/flutterwave/webhook/", flutterwave_webhook, name="flutter_webhook"),
     path("payments/flutterwave/callback/", flutterwave_callback, name="flutter_callback"),
-    path("customers/payments/", get_customer_qr_payments),
+    path("customers/payments/", get_customer_qr_payments, name="customer_payments"),
+    path("customers/payments/export/", CustomerPaymentsExportView.as_view(), name="customer_payments_export"),
     path("payments/<int:order_id>/", get_payment_by_order, name="get-payment"),
-    path('payments/status/<int:reference>/', payment_status, name='payment-status'),
+    path('payments/status/<str:reference>/', payment_status, name='payment-status'),
 ]
+
+if settings.ASYNC_VIEWS:
+    # Under ASGI (backend/asgi.py) these routes are served by native async views
+    from . import async_views
+
+    ASYNC_ROUTES = {
+        "goods-list": async_views.goods_list,
+        "goods-detail": async_views.goods_detail,
+        "customer_order": async_views.my_orders,
+        "order-detail": async_views.my_order_detail,
+        "producer_order": async_views.producer_orders,
+        "producer_order_detail": async_views.producer_order_detail,
+        "create_qr_payment": async_views.create_flutterwave_qr,
+        "customer_payments": async_views.customer_payments,
+        "get-payment": async_views.payment_by_order,
+        "payment-status": async_views.payment_status,
+    }
+    urlpatterns = [
+        path(str(pattern.pattern), ASYNC_ROUTES.get(pattern.name, pattern.callback), name=pattern.name)
+        for pattern in urlpatterns
+    ]
@@ -1,27 +1,99 @@
+import logging
+
 from django.shortcuts import render
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
+from django.core.handlers.asgi import ASGIRequest
 from django.http import JsonResponse
 import json
-import requests
 from rest_framework import generics, permissions
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 from .models import Goods, Order, Payment, ProducerWallet
-from .serializers import GoodsSerializer, OrderSerializer, PaymentSerializer, ProducerWalletSerializer
+from .serializers import (
+    GoodsSerializer, GoodsSummarySerializer, OrderSerializer, PaymentSerializer, ProducerWalletSerializer,
+)
+from .caching import CachedRetrieveMixin, catalogue_version, goods_version
+from .pagination import GoodsCursorPagination, SearchPagination
+from .search import search_goods
+from .stock import confirm_order
+from . import bulk, exports, webhooks
+from .idempotency import idempotent
+from .analytics import PERIODS, sales_summary
+from .gateway import GatewayError, get_gateway
+from .reconcile import TERMINAL_STATUSES, apply_gateway_status, checked_status, gateway_status
+from .renderers import ORJSONRenderer
+from .throttles import PaymentStatusThrottle
 from django.http import HttpResponse
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, throttle_classes
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from cloudinary import uploader
+from rest_framework.exceptions import PermissionDenied
+
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+logger = logging.getLogger(__name__)
+
+
+class SparseFieldsViewMixin:
+    """
+    Query only the columns the serializer reads once `?fields=` is applied.
+
+    `required_columns` are loaded regardless, e.g. the pagination cursor's.
+    """
+    required_columns = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return self.get_serializer().optimize_queryset(queryset, self.required_columns)
 
-from django.utils import timezone
-from django.utils.dateparse import parse_datetime
 
+class ValuesListMixin(SparseFieldsViewMixin):
+    """
+    List from `.values()` rows through the serializer's `rows()` fast path,
+    rendered with orjson. The payload is the same as the serializer's `.data`.
+    """
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
 
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        # rows() loads nested data itself, so prefetches have nothing to attach to
+        queryset = queryset.prefetch_related(None).values(*serializer.value_columns(), *self.required_columns)
 
-class GoodsListView(generics.ListAPIView):
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.rows(page))
+        return Response(serializer.rows(queryset))
+
+
+class GoodsListView(CachedRetrieveMixin, ValuesListMixin, generics.ListAPIView):
     queryset = Goods.objects.all()
-    serializer_class = GoodsSerializer
+    serializer_class = GoodsSummarySerializer
+    required_columns = ["created_at"]
     permission_classes = [AllowAny]
+    pagination_class = GoodsCursorPagination
+    image_size = "small"
+
+    def cache_version(self):
+        return catalogue_version()
+
+
+class GoodsSearchView(ValuesListMixin, generics.ListAPIView):
+    """
+    Ranked full-text search over name and description.
+
+    Query params: q, min_price, max_price, producer, in_stock.
+    """
+    serializer_class = GoodsSummarySerializer
+    permission_classes = [AllowAny]
+    pagination_class = SearchPagination
+    image_size = "small"
+
+    def get_queryset(self):
+        return search_goods(Goods.objects.all(), self.request.query_params)
 
 
 class GoodsCreateView(generics.CreateAPIView):
@@ -29,10 +101,13 @@ class GoodsCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
 
-class GoodsDetailView(generics.RetrieveAPIView):
+class GoodsDetailView(CachedRetrieveMixin, SparseFieldsViewMixin, generics.RetrieveAPIView):
     queryset = Goods.objects.all()
     serializer_class = GoodsSerializer
 
+    def cache_version(self):
+        return goods_version(self.kwargs["pk"])
+
 
 class GoodsUpdateView(generics.UpdateAPIView):
     queryset = Goods.objects.all()
@@ -44,15 +119,8 @@ class GoodsUpdateView(generics.UpdateAPIView):
         
         if self.request.user != goods.producer:
             raise PermissionDenied("You can only update your own goods.")
-        
-        # If a new image is being uploaded, delete the old one
-        new_image = self.request.FILES.get('image')
-        if new_image and goods.image:
-            try:
-                uploader.destroy(goods.image.public_id)
-            except Exception as e:
-                print("Error deleting old image from Cloudinary:", e)
-        
+
+        # A new image replaces the old one in the background, see GoodsSerializer.update
         serializer.save()
 
 
@@ -67,70 +135,193 @@ class GoodsDeleteView(generics.DestroyAPIView):
         instance.delete()
 
 
-class MyGoodsView(generics.ListAPIView):
-    serializer_class = GoodsSerializer
+class MyGoodsView(ValuesListMixin, generics.ListAPIView):
+    serializer_class = GoodsSummarySerializer
     permission_classes = [permissions.IsAuthenticated]
+    image_size = "small"
 
     def get_queryset(self):
+        # role comes from the token claims, see users.authentication
         user = self.request.user
-        print(f"User accessing MyGoodsView: {user.name} ({user.email} {user.role})")  # <-- print the user
-
         if getattr(user, "role", None) != "producer":
-            print("User is not a producer. Returning empty queryset.")
             return Goods.objects.none()
-        
-        print("User is a producer. Returning their goods.")
         return Goods.objects.filter(producer=user)
 
 
+class ProducerOnly(permissions.BasePermission):
+    message = "Only producers can do this."
+
+    def has_permission(self, request, view):
+        return getattr(request.user, "role", None) == "producer"
+
+
+class GoodsImportView(APIView):
+    """
+    Upsert the producer's catalogue from an uploaded CSV or NDJSON `file`, keyed on sku.
+
+    The format follows `?type=csv|ndjson`, else the file name. Rows are
+    validated and saved in chunks; valid rows are kept when others fail,
+    and the response lists the failures.
+    """
+    permission_classes = [permissions.IsAuthenticated, ProducerOnly]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"error": "Upload the catalogue as `file`"}, status=400)
+        try:
+            rows = bulk.READERS[bulk.format_for(upload, request.query_params.get("type"))](upload)
+            result = bulk.import_goods(request.user, rows)
+        except bulk.ImportFormatError as e:
+            # Rows before the unreadable part are saved; say how many
+            return Response({"error": str(e), **(e.result or {})}, status=400)
+        return Response(result)
+
+
+class ExportView(APIView):
+    """
+    Base for the streaming exports: `?type=csv|ndjson` (CSV by default),
+    plus `start` / `end` dates (YYYY-MM-DD, inclusive) where `date_field` is set.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    filename = None
+    date_field = None
+
+    def lines(self, file_format, filters):
+        raise NotImplementedError
+
+    def get(self, request):
+        file_format = request.query_params.get("type", "csv")
+        if file_format not in exports.FORMATS:
+            return Response({"error": f"type must be one of {', '.join(exports.FORMATS)}"}, status=400)
+        filters = {}
+        if self.date_field:
+            try:
+                filters = exports.date_range(request.query_params, self.date_field)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=400)
+        return exports.streaming_response(
+            self.lines(file_format, filters), file_format, self.filename,
+            asynchronous=isinstance(request._request, ASGIRequest),
+        )
+
+
+class GoodsExportView(ExportView):
+    """The producer's whole catalogue."""
+    permission_classes = [permissions.IsAuthenticated, ProducerOnly]
+    filename = "goods"
+
+    def lines(self, file_format, filters):
+        return bulk.export_goods(self.request.user, file_format)
+
+
+class MyOrdersExportView(ExportView):
+    """The customer's orders with their items, for accounting."""
+    filename = "orders"
+    date_field = "created_at"
+
+    def lines(self, file_format, filters):
+        return exports.encode_orders(Order.objects.for_customer(self.request.user).filter(**filters), file_format)
+
+
+class ProducerOrdersExportView(ExportView):
+    """Orders containing the producer's goods, with their items."""
+    filename = "orders"
+    date_field = "created_at"
+
+    def lines(self, file_format, filters):
+        return exports.encode_orders(Order.objects.for_producer(self.request.user).filter(**filters), file_format)
+
+
+class CustomerPaymentsExportView(ExportView):
+    filename = "payments"
+    date_field = "created_at"
+
+    def lines(self, file_format, filters):
+        payments = Payment.objects.filter(order__customer=self.request.user, **filters)
+        return exports.encode_payments(payments, file_format)
+
+
 class CreateOrderView(generics.CreateAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_serializer(self, *args, **kwargs):
+        # A JSON array creates several orders at once
+        if isinstance(kwargs.get("data"), list):
+            kwargs.update(many=True, allow_empty=False, max_length=settings.ORDER_BATCH_MAX_ORDERS)
+        return super().get_serializer(*args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(customer=self.request.user)
 
 
-class MyOrdersView(generics.ListAPIView):
+class MyOrdersView(ValuesListMixin, generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(customer=self.request.user)
+        return Order.objects.for_customer(self.request.user).with_items()
 
 
-class ProducerOrderView(generics.ListAPIView):
+class ProducerOrderView(ValuesListMixin, generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(items__product__producer=self.request.user).distinct()
+        return Order.objects.for_producer(self.request.user).with_items()
 
-class MyOrderDetailView(generics.RetrieveAPIView):
+class MyOrderDetailView(SparseFieldsViewMixin, generics.RetrieveAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(customer=self.request.user)
+        return Order.objects.for_customer(self.request.user).with_items()
 
-class ProducerOrderDetailView(generics.RetrieveAPIView):
+class ProducerOrderDetailView(SparseFieldsViewMixin, generics.RetrieveAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(items__product__producer=self.request.user).distinct()
+        return Order.objects.for_producer(self.request.user).with_items()
 
-@api_view(["POST"])
-def create_flutterwave_qr(request, order_id):
-    try:
-        order = Order.objects.get(id=order_id)
-    except Order.DoesNotExist:
-        return Response({"error": "Order not found"}, status=404)
+class ProducerWalletView(generics.RetrieveAPIView):
+    """The producer's balance and running sales totals, kept current as payments complete."""
+    serializer_class = ProducerWalletSerializer
+    permission_classes = [permissions.IsAuthenticated]
 
-    tx_ref = f"order-{order.id}-{int(order.created_at.timestamp())}"
+    def get_object(self):
+        wallet, _ = ProducerWallet.objects.select_related("producer").get_or_create(producer=self.request.user)
+        return wallet
 
-    payload = {
-        "tx_ref": tx_ref,
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def producer_analytics(request):
+    """
+    Sales for the current producer from the daily rollups.
+
+    Query params: period (day | week | month), start and end (YYYY-MM-DD),
+    defaulting to the last 365 days.
+    """
+    period = request.query_params.get("period", "day")
+    if period not in PERIODS:
+        return Response({"error": f"period must be one of {', '.join(PERIODS)}"}, status=400)
+
+    dates = {}
+    for name in ("start", "end"):
+        value = request.query_params.get(name)
+        dates[name] = parse_date(value) if value else None
+        if value and dates[name] is None:
+            return Response({"error": f"{name} must be a date (YYYY-MM-DD)"}, status=400)
+
+    return Response(sales_summary(request.user, period, **dates))
+
+
+def qr_payment_payload(order):
+    """Flutterwave's initialize-payment body for `order`; tx_ref is stable per order."""
+    return {
+        "tx_ref": f"order-{order.id}-{int(order.created_at.timestamp())}",
         "amount": float(order.total_price),
         "currency": "NGN",
         "payment_options": "card,bank,ussd",
@@ -139,33 +330,47 @@ def create_flutterwave_qr(request, order_id):
         "meta": {"order_id": order.id}
     }
 
-    headers = {
-        "Authorization": f"Bearer {settings.FLW_SECRET_KEY}",
-        "Content-Type": "application/json"
-    }
 
-    resp = requests.post(
-        "https://api.flutterwave.com/v3/payments",
-        json=payload,
-        headers=headers,
-        timeout=15
-    )
+@api_view(["POST"])
+@idempotent
+def create_flutterwave_qr(request, order_id):
+    try:
+        order = Order.objects.select_related("customer", "payment").get(id=order_id)
+    except Order.DoesNotExist:
+        return Response({"error": "Order not found"}, status=404)
+
+    # An order has a single payment; repeat calls get it back without going upstream
+    existing = getattr(order, "payment", None)
+    if existing is not None:
+        return Response(PaymentSerializer(existing).data)
 
-    data = resp.json()
-    print("INITIAL PAYMENT RESPONSE:", data)
+    payload = qr_payment_payload(order)
+    tx_ref = payload["tx_ref"]
+
+    try:
+        data = get_gateway().initialize_payment(payload)
+    except GatewayError:
+        logger.warning("Payment gateway unavailable", extra={"order_id": order.id}, exc_info=True)
+        return Response({"error": "Payment gateway unavailable"}, status=503)
 
     if data.get("status") != "success":
+        logger.warning(
+            "Payment initialization rejected",
+            extra={"order_id": order.id, "tx_ref": tx_ref, "gateway_message": data.get("message")},
+        )
         return Response({"error": "Flutterwave init failed", "detail": data}, status=400)
 
     hosted_link = data["data"]["link"]
 
-    # Save payment record
-    payment = Payment.objects.create(
-        order=order,
+    # Save payment record; a concurrent call may have won the unique reference
+    payment, _ = Payment.objects.get_or_create(
         reference=tx_ref,
-        amount=order.total_price,
-        qr_code=hosted_link,
-        status="pending"
+        defaults={
+            "order": order,
+            "amount": order.total_price,
+            "qr_code": hosted_link,
+            "status": "pending",
+        },
     )
 
     return Response(PaymentSerializer(payment).data)
@@ -179,67 +384,17 @@ def flutterwave_webhook(request):
         if signature != settings.FLUTTERWAVE_WEBHOOK_SECRET:
             return JsonResponse({"error": "Invalid signature"}, status=401)
 
-   
-    payload = json.loads(request.body.decode("utf-8"))
-    print("WEBHOOK RECEIVED:", payload)
-
-    event = payload.get("event")
-    data = payload.get("data", {})
-
-    if event != "charge.completed":
-        return JsonResponse({"status": "ignored"}, status=200)
-
-    status = data.get("status")
-    tx_ref = data.get("tx_ref")
-    amount_paid = data.get("amount")
-    currency_paid = data.get("currency")
-    flutterwave_timestamp = data.get("created_at")
-
-    
-    order_id = data.get("meta", {}).get("order_id")
-
-    
-    if not order_id:
-        try:
-            order_id = tx_ref.split("-")[1]
-        except:
-            return JsonResponse({"error": "Order ID missing"}, status=400)
-
-    if status != "successful":
-        return JsonResponse({"status": "ignored"}, status=200)
-
-   
     try:
-        order = Order.objects.get(id=order_id)
-        payment = Payment.objects.get(reference=tx_ref)
-    except:
-        return JsonResponse({"error": "Order/payment missing"}, status=404)
-
-   
-    if float(amount_paid) != float(order.total_price):
-        return JsonResponse({"error": "Amount mismatch"}, status=400)
-
-    if currency_paid != "NGN": 
-        return JsonResponse({"error": "Currency mismatch"}, status=400)
-
-    
-    payment.status = "paid"
-    if flutterwave_timestamp:
-        payment.paid_at = parse_datetime(flutterwave_timestamp)
-    else:
-        payment.paid_at = timezone.now()
-        
-    payment.save()
-
-    order.status = "PAID"
-    order.save()
+        payload = json.loads(request.body.decode("utf-8"))
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
 
-   
-    for item in order.items.all():
-        item.product.quality -= item.quality
-        item.product.save()
+    if payload.get("event") not in webhooks.HANDLERS:
+        return JsonResponse({"status": "ignored"}, status=200)
 
-    return JsonResponse({"status": "success"}, status=200)
+    # Acknowledge right away; `manage.py process_webhooks` does the work
+    webhooks.enqueue(payload, request.body)
+    return JsonResponse({"status": "queued"}, status=200)
 
 
 
@@ -257,12 +412,14 @@ def flutterwave_callback(request):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@renderer_classes([ORJSONRenderer, BrowsableAPIRenderer])
 def get_customer_qr_payments(request):
+    serializer = PaymentSerializer(context={"request": request})
     payments = Payment.objects.filter(
         order__customer=request.user
-    ).order_by("-created_at")
+    ).order_by("-created_at").values(*serializer.value_columns())
 
-    return Response(PaymentSerializer(payments, many=True).data)
+    return Response(serializer.rows(payments))
 
 
 
@@ -280,32 +437,26 @@ def get_payment_by_order(request, order_id):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([PaymentStatusThrottle])
 def payment_status(request, reference):
 
     try:
-        payment = Payment.objects.get(reference=reference)
+        payment = Payment.objects.select_related("order").get(reference=reference)
     except Payment.DoesNotExist:
         return Response({"error": "Payment not found"}, status=404)
 
-    # Call Flutterwave
-    url = f"https://api.flutterwave.com/v3/transactions?tx_ref={reference}"
-    headers = {"Authorization": f"Bearer {settings.FLUTTERWAVE_SECRET_KEY}"}
-
-    r = requests.get(url, headers=headers)
-    data = r.json()
+    # Settled payments never change; answer from the database
+    if payment.status in TERMINAL_STATUSES:
+        return Response({"status": TERMINAL_STATUSES[payment.status], "reference": reference})
 
-    if data.get("status") == "success" and data["data"]:
-        flw_status = data["data"][0]["status"]  # successful | failed | pending
-
-        payment.status = flw_status
-        payment.save()
-
-        payment.order.status = "PAID" if flw_status == "successful" else "PENDING"
-        payment.order.save()
+    try:
+        flw_status = checked_status(payment, gateway_status(reference))  # successful | failed | pending
+    except GatewayError:
+        return Response({"error": "Payment gateway unavailable"}, status=503)
 
-        return Response({
-            "status": flw_status,
-            "reference": reference
-        })
+    apply_gateway_status(payment, flw_status)
 
-    return Response({"status": "pending"})
+    return Response({
+        "status": flw_status,
+        "reference": reference
+    })
@@ -0,0 +1,104 @@
+import hashlib
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .jobs import claim_due, mark_done, mark_failed, retry_later
+from .models import Payment, WebhookEvent
+from .stock import confirm_order
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookRejected(Exception):
+    """The event can never succeed (unknown order, wrong amount...); do not retry it."""
+
+
+def event_id_for(payload, body):
+    data = payload.get("data") or {}
+    if data.get("id"):
+        return f"{payload.get('event')}:{data['id']}"
+    return hashlib.sha256(body).hexdigest()
+
+
+def enqueue(payload, body):
+    """Store an incoming event in the inbox. Duplicate deliveries are dropped by the unique event_id."""
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(event_id=event_id_for(payload, body), event_type=payload.get("event") or "", payload=payload)],
+        ignore_conflicts=True,
+    )
+
+
+def handle_charge_completed(data):
+    status = data.get("status")
+    tx_ref = data.get("tx_ref")
+    amount_paid = data.get("amount")
+    currency_paid = data.get("currency")
+    flutterwave_timestamp = data.get("created_at")
+
+    order_id = (data.get("meta") or {}).get("order_id")
+    if not order_id:
+        try:
+            order_id = tx_ref.split("-")[1]
+        except (AttributeError, IndexError):
+            raise WebhookRejected("Order ID missing")
+
+    if status != "successful":
+        return
+
+    try:
+        payment = Payment.objects.select_related("order").get(reference=tx_ref, order_id=order_id)
+    except (Payment.DoesNotExist, ValueError):
+        raise WebhookRejected("Order/payment missing")
+
+    # Redelivered or replayed charge: it has already been applied
+    if payment.status == "paid":
+        return
+
+    order = payment.order
+
+    if float(amount_paid) != float(order.total_price):
+        raise WebhookRejected("Amount mismatch")
+
+    if currency_paid != "NGN":
+        raise WebhookRejected("Currency mismatch")
+
+    payment.status = "paid"
+    if flutterwave_timestamp:
+        payment.paid_at = parse_datetime(flutterwave_timestamp)
+    else:
+        payment.paid_at = timezone.now()
+
+    with transaction.atomic():
+        payment.save()
+        # Flips the order to PAID and keeps its reserved stock, once only
+        confirm_order(order)
+
+
+HANDLERS = {
+    "charge.completed": handle_charge_completed,
+}
+
+
+def process_event(event):
+    handler = HANDLERS.get(event.event_type)
+    try:
+        if handler:
+            handler(event.payload.get("data") or {})
+    except WebhookRejected as e:
+        mark_failed(event, str(e))
+    except Exception as e:
+        logger.exception("Webhook event %s failed (attempt %s)", event.event_id, event.attempts)
+        retry_later(event, repr(e))
+    else:
+        mark_done(event)
+
+
+def process_batch(batch_size=50):
+    """Claim and process one batch. Returns how many events were handled."""
+    events = claim_due(WebhookEvent, batch_size)
+    for event in events:
+        process_event(event)
+    return len(events)
@@ -0,0 +1,115 @@
+"""
+JWT authentication that builds request.user from the token's claims.
+
+Tokens from users.tokens.ClaimsRefreshToken carry the user's name, role and
+is_active, so authenticating them needs no user query. What a token can't
+know, that the account was deactivated after it was issued, is checked
+against a per-process cache that holds each answer for
+AUTH_STATE_CACHE_SECONDS.
+"""
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .tokens import USER_CLAIMS
+
+# user id -> (expires at, is active)
+_active = {}
+_active_lock = threading.Lock()
+MAX_CACHED_USERS = 10000
+
+
+def _cached_active(user_id):
+    entry = _active.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _remember_active(user_id, active):
+    with _active_lock:
+        if len(_active) >= MAX_CACHED_USERS:
+            _active.clear()
+        _active[user_id] = (time.monotonic() + settings.AUTH_STATE_CACHE_SECONDS, active)
+    return active
+
+
+def is_active(user_id):
+    active = _cached_active(user_id)
+    if active is None:
+        active = _remember_active(user_id, User.objects.filter(pk=user_id, is_active=True).exists())
+    return active
+
+
+async def ais_active(user_id):
+    active = _cached_active(user_id)
+    if active is None:
+        active = _remember_active(user_id, await User.objects.filter(pk=user_id, is_active=True).aexists())
+    return active
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    # Only this process's entry; other processes notice within the TTL
+    _active.pop(instance.pk, None)
+
+
+def user_from_claims(user_id, token):
+    """A User with only the claimed fields loaded; the others load from the database on access."""
+    claims = {claim: token[claim] for claim in USER_CLAIMS}
+    claims["id"] = user_id
+    # from_db expects values in field order
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in claims]
+    return User.from_db(DEFAULT_DB_ALIAS, fields, [claims[name] for name in fields])
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def claimed_user_id(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise AuthenticationFailed(_("Token contained no recognizable user identification"))
+        if not validated_token["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        # Tokens hold the id as a string
+        return User._meta.pk.to_python(user_id)
+
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in USER_CLAIMS):
+            # Issued before tokens carried claims
+            return super().get_user(validated_token)
+
+        user_id = self.claimed_user_id(validated_token)
+        if not is_active(user_id):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user_from_claims(user_id, validated_token)
+
+    async def aget_user(self, validated_token):
+        if not all(claim in validated_token for claim in USER_CLAIMS):
+            return await sync_to_async(super().get_user)(validated_token)
+
+        user_id = self.claimed_user_id(validated_token)
+        if not await ais_active(user_id):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user_from_claims(user_id, validated_token)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views: only a cache miss on the user's state touches the database."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
@@ -1,22 +1,36 @@
+import logging
+
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from .models import User
+from .tokens import ClaimsRefreshToken
 from django.contrib.auth import authenticate
+from django.db import IntegrityError, transaction
+
+logger = logging.getLogger(__name__)
 
 class RegisterSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
         fields = ['email', 'name', 'password', 'role']
-        extra_kwargs = {'password': {'write_only': True}}
+        extra_kwargs = {
+            'password': {'write_only': True},
+            # Enforced by the unique index in create() rather than a query up front
+            'email': {'validators': []},
+        }
 
     def validate_email(self, value):
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Email already exists")
-        return value
+        return value.lower()
 
     def create(self, validated_data):
-        validated_data['email'] = validated_data['email'].lower()
-        return User.objects.create_user(**validated_data)
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(**validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({"email": ["Email already exists"]})
 
 
 
@@ -26,8 +40,8 @@ class LoginSerializer(serializers.Serializer):
 
     def validate(self, data):
         user = authenticate(email=data.get('email').lower(), password=data.get('password'))
-        print(user)
         if not user:
+            logger.info("Login failed", extra={"reason": "invalid_credentials"})
             raise serializers.ValidationError("Invalid credentials")
         if not user.is_active:
             raise serializers.ValidationError("Account disbaled")
@@ -38,3 +52,27 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "email", "name", "role", "date_joined"]
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Issues access tokens with the user's current claims. The refresh token's
+    copy is as old as the login, so a role change would otherwise only reach
+    access tokens after REFRESH_TOKEN_LIFETIME.
+    """
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user = User.objects.filter(pk=refresh.get(api_settings.USER_ID_CLAIM)).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        refresh.set_user_claims(user)
+        data = {"access": str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+        return data
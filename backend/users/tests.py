@@ -1,3 +1,148 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ordora.models import Goods
+
+from . import authentication
+from .models import User
+from .throttles import LoginIPThrottle
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        authentication._active.clear()
+        self.client = APIClient()
+        response = self.client.post(
+            "/api/auth/register/",
+            {"email": "producer@example.com", "name": "Producer", "password": "pass", "role": "producer"},
+        )
+        self.access = response.data["access"]
+        self.user = User.objects.get(email="producer@example.com")
+        Goods.objects.create(name="Rice", price=10, producer=self.user)
+
+    def test_tokens_carry_user_claims(self):
+        token = AccessToken(self.access)
+        self.assertEqual((token["name"], token["role"], token["is_active"]), ("Producer", "producer", True))
+
+        response = self.client.post("/api/auth/login/", {"email": "producer@example.com", "password": "pass"})
+        self.assertEqual(AccessToken(response.data["access"])["role"], "producer")
+
+    def test_requests_skip_the_user_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+        self.client.get("/api/goods/me/")
+
+        # Just the goods query once the active check is cached
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/goods/me/")
+        self.assertEqual(len(response.data), 1)
+
+    def test_deactivated_users_are_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+        self.assertEqual(self.client.get("/api/goods/me/").status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/goods/me/").status_code, 401)
+
+    def test_tokens_without_claims_still_work(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.assertEqual(self.client.get("/api/goods/me/").status_code, 200)
+
+
+    def test_refresh_reissues_current_claims(self):
+        refresh = self.client.post(
+            "/api/auth/login/", {"email": "producer@example.com", "password": "pass"}
+        ).data["refresh"]
+        User.objects.filter(pk=self.user.pk).update(role="customer", name="Customer")
+
+        response = self.client.post("/api/auth/token/refresh/", {"refresh": refresh})
+        self.assertEqual(response.status_code, 200)
+        token = AccessToken(response.data["access"])
+        self.assertEqual((token["name"], token["role"]), ("Customer", "customer"))
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post("/api/auth/token/refresh/", {"refresh": refresh})
+        self.assertEqual(response.status_code, 401)
+
+
+class PasswordAndLoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="customer@example.com", name="Customer", password="pass")
+
+    def login(self, password="pass", **extra):
+        return self.client.post(
+            "/api/auth/login/", {"email": "Customer@Example.com", "password": password}, **extra
+        )
+
+    def test_new_passwords_use_argon2(self):
+        self.assertTrue(self.user.password.startswith("argon2$argon2id$"))
+        self.assertIn("m=19456,t=2,p=1", self.user.password)
+
+    def test_older_hashes_are_upgraded_on_login(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password("pass", hasher="pbkdf2_sha256"))
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("argon2$"))
+
+        with override_settings(ARGON2_TIME_COST=3):
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIn("t=3", self.user.password)
+
+    def test_duplicate_registration_is_caught_by_the_unique_index(self):
+        response = self.client.post(
+            "/api/auth/register/", {"email": "CUSTOMER@example.com", "name": "Again", "password": "pass"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["email"], ["Email already exists"])
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_login_floods_are_rejected_before_hashing(self):
+        with mock.patch("users.serializers.authenticate", return_value=None) as authenticate:
+            # Per account, across addresses
+            for i in range(10):
+                self.assertEqual(self.login("wrong", REMOTE_ADDR=f"10.0.0.{i}").status_code, 400)
+            self.assertEqual(self.login("wrong", REMOTE_ADDR="10.0.1.1").status_code, 429)
+            self.assertEqual(authenticate.call_count, 10)
+
+        cache.clear()
+        with mock.patch.dict(LoginIPThrottle.THROTTLE_RATES, {"login_ip": "2/min"}):
+            for email in ("a@example.com", "b@example.com"):
+                self.client.post("/api/auth/login/", {"email": email, "password": "x"})
+            response = self.client.post("/api/auth/login/", {"email": "c@example.com", "password": "x"})
+        self.assertEqual(response.status_code, 429)
+
+    def test_login_body_that_is_not_an_object_is_a_bad_request(self):
+        response = self.client.post("/api/auth/login/", [1, 2], format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_forwarded_for_headers_do_not_reset_the_ip_limit(self):
+        with mock.patch.dict(LoginIPThrottle.THROTTLE_RATES, {"login_ip": "2/min"}):
+            responses = [
+                self.client.post(
+                    "/api/auth/login/", {"email": f"{i}@example.com", "password": "x"},
+                    HTTP_X_FORWARDED_FOR=f"198.51.100.{i}",
+                )
+                for i in range(3)
+            ]
+        self.assertEqual([r.status_code for r in responses], [400, 400, 429])
+
+        cache.clear()
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}), \
+                mock.patch.dict(LoginIPThrottle.THROTTLE_RATES, {"login_ip": "2/min"}):
+            # Behind one proxy, the address it forwarded is the client's
+            for i in range(3):
+                response = self.client.post(
+                    "/api/auth/login/", {"email": "a@example.com", "password": "x"},
+                    HTTP_X_FORWARDED_FOR=f"198.51.100.{i}",
+                )
+                self.assertEqual(response.status_code, 400)
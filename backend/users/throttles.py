@@ -0,0 +1,33 @@
+import hashlib
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class IPRateThrottle(SimpleRateThrottle):
+    """Limits requests per client address, authenticated or not."""
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class LoginIPThrottle(IPRateThrottle):
+    scope = "login_ip"
+
+
+class RegisterIPThrottle(IPRateThrottle):
+    scope = "register_ip"
+
+
+class LoginAccountThrottle(SimpleRateThrottle):
+    """Limits login attempts per account, whichever addresses they come from."""
+    scope = "login_account"
+
+    def get_cache_key(self, request, view):
+        # Bodies that aren't an object are rejected by the serializer
+        if not isinstance(request.data, dict):
+            return None
+        email = request.data.get("email")
+        if not isinstance(email, str) or not email.strip():
+            return None
+        ident = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {"scope": self.scope, "ident": ident}
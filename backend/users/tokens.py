@@ -0,0 +1,18 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# User fields copied into every token, see users.authentication
+USER_CLAIMS = ("name", "role", "is_active")
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token whose claims (and its access tokens') describe the user."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_user_claims(user)
+        return token
+
+    def set_user_claims(self, user):
+        for claim in USER_CLAIMS:
+            self[claim] = getattr(user, claim)
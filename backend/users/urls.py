@@ -1,9 +1,6 @@
 from django.urls import path
-from .views import RegisterView, LoginView, UserDetailView
-from rest_framework_simplejwt.views import (
-    TokenRefreshView,
-    TokenVerifyView,
-)
+from .views import RegisterView, LoginView, TokenRefreshView, UserDetailView
+from rest_framework_simplejwt.views import TokenVerifyView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
@@ -2,9 +2,11 @@ from django.shortcuts import render
 from rest_framework.response import Response
 from rest_framework import status, generics
 from .models import User
-from .serializers import RegisterSerializer, LoginSerializer,UserSerializer
-from rest_framework_simplejwt.tokens import RefreshToken
+from .serializers import ClaimsTokenRefreshSerializer, RegisterSerializer, LoginSerializer,UserSerializer
+from .tokens import ClaimsRefreshToken
+from rest_framework_simplejwt import views as jwt_views
 from rest_framework.permissions import AllowAny
+from .throttles import LoginAccountThrottle, LoginIPThrottle, RegisterIPThrottle
 
 
 # Create your views here.
@@ -12,6 +14,7 @@ class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [RegisterIPThrottle]
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -19,7 +22,7 @@ class RegisterView(generics.CreateAPIView):
         user = serializer.save()
 
         # Generate tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         return Response({
             "user": serializer.data,
             "access": str(refresh.access_token),
@@ -30,18 +33,24 @@ class RegisterView(generics.CreateAPIView):
 class LoginView(generics.GenericAPIView):
     serializer_class = LoginSerializer
     permission_classes = [AllowAny]
+    # Throttles run before the serializer, so rejected attempts cost no hashing
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
 
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         return Response({
             "user": {"id": user.id,"email": user.email, "role": user.role, "name": user.name,"date_joined":user.date_joined},
             "refresh": str(refresh),
             "access": str(refresh.access_token)
         })
 
+class TokenRefreshView(jwt_views.TokenRefreshView):
+    serializer_class = ClaimsTokenRefreshSerializer
+
+
 class UserDetailView(generics.RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -17,10 +17,13 @@ export default function GoodsList() {
   const [data, setData] = useState([]);
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
-  const fetchGoods = async () => {
+  const fetchGoods = async (cursor = null) => {
     try {
-      const res = await apiFetch(`goods/`, {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+      const res = await apiFetch(`goods/${query}`, {
         method: "GET",
         headers: {
           "Content-Type": "application/json",
@@ -31,18 +34,17 @@ export default function GoodsList() {
   
       const json = await res.json();
   
-   
-      const sortedData = json.sort(
-        (a, b) => new Date(b.created_at) - new Date(a.created_at)
-      );
-  
-      setData(sortedData);
+      // The server returns pages newest first; keep the cursor for the next page
+      const next = json.next ? new URL(json.next).searchParams.get("cursor") : null;
+      setNextCursor(next);
+      setData((prev) => (cursor ? [...prev, ...json.results] : json.results));
     } catch (error) {
       console.log("Error:", error);
-      setData([]);
+      if (!cursor) setData([]);
     } finally {
       setLoading(false);
       setRefreshing(false);
+      setLoadingMore(false);
     }
   };
   
@@ -55,6 +57,12 @@ export default function GoodsList() {
     fetchGoods();
   };
 
+  const onEndReached = () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    fetchGoods(nextCursor);
+  };
+
   if (loading) {
     return (
       <View style={styles.loadingContainer}>
@@ -75,6 +83,11 @@ export default function GoodsList() {
             <RefreshControl refreshing={refreshing} onRefresh={onRefresh} />
           }
           contentContainerStyle={{ paddingBottom: 80 }}
+          onEndReached={onEndReached}
+          onEndReachedThreshold={0.5}
+          ListFooterComponent={
+            loadingMore ? <ActivityIndicator color="#007BFF" /> : null
+          }
           renderItem={({ item }) => (
             <TouchableOpacity
               style={styles.card}
@@ -19,7 +19,7 @@ export default function Orders() {
   const fetchOrders = async () => {
     try {
       const token = await AsyncStorage.getItem("access");
-      const response = await apiFetch(`goods/producer/order/`, {
+      const response = await apiFetch(`goods/producer/order/?fields=id,status,total_price,created_at`, {
         method: "GET",
         headers: {
           "Content-Type": "application/json",